@@ -0,0 +1,187 @@
+# anomaly_figures.py
+"""
+Declarative anomaly-map pipeline.
+
+Replaces plt_tas_anom.py / plt_tsa_temp.py. anomaly_figures.json lists the
+variables, baseline, periods, colour scales and output templates. Each
+variable is reduced once (baseline + all decades in one cached streaming
+pass) and every variant is rendered from the same in-memory anomaly fields,
+so adding a colour-scale variant only costs a render.
+
+Top-level "member"/"experiment" select one run; "members"/"experiments"
+lists switch to ensemble mode, where each variant can pick a "statistic"
+(mean, std, p05, p50, p95) across members and templates may use
+{experiment} and {statistic}.
+
+Config keys per figure:
+    variable, table   – e.g. "tas", "Amon"
+    baseline          – [start_year, end_year]
+    periods           – "decades" (one per catalog file) or [[start, end], ...]
+    cmap, title, cbar_label
+    variants          – [{"levels": [lo, hi, n], "output": "name_{start}.png",
+                          optional "cmap"/"title"/"cbar_label" overrides}]
+    hot               – optional; true reads the raw field through the
+                        memory-mapped hot cache (hot_cache.py), so new
+                        periods/baselines skip Zarr decompression
+Templates may use {variable}, {start}, {end}, {baseline_start},
+{baseline_end}.
+
+Usage:
+    python anomaly_figures.py [--config anomaly_figures.json] [--processes N]
+"""
+
+import argparse
+import json
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import catalog
+from ensemble import ensemble_stats, open_ensemble
+from paths import DATA_DIR, FIGURES_DIR
+from prefetch import prefetch
+from reduce_cache import reduce_period, reduce_stream
+from render import MapJob, render_jobs
+
+DEFAULT_CONFIG = Path(__file__).with_name("anomaly_figures.json")
+
+
+def load_config(path=DEFAULT_CONFIG):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def periods_for(spec, members, experiments, data_dir=DATA_DIR):
+    if spec["periods"] != "decades":
+        return [tuple(int(y) for y in p) for p in spec["periods"]]
+    periods = set()
+    for e in catalog.find(spec["variable"], spec["table"], data_dir=data_dir):
+        if e.member in members and e.experiment in experiments:
+            periods.add((catalog.start_year(e), catalog.end_year(e)))
+    return sorted(periods)
+
+
+# ------------------------------------------------------------------
+# Reduce once per variable
+# ------------------------------------------------------------------
+def anomaly_fields(spec, member, experiment, data_dir=DATA_DIR):
+    """
+    {(experiment, "mean", start, end): anomaly DataArray} for every period
+    of one figure spec and a single run.
+    """
+    variable, table = spec["variable"], spec["table"]
+    baseline = tuple(spec["baseline"])
+
+    hot = spec.get("hot", False)
+
+    products = reduce_stream(variable, table, groupings=("decadal", "baseline"),
+                             baseline=baseline, member=member,
+                             experiment=experiment, data_dir=data_dir, hot=hot)
+    base = products.baseline
+
+    def period_mean(start, end):
+        if start % 10 == 0 and end <= start + 9 and start in products.decade:
+            return products.decadal.sel(decade=start)
+        return reduce_period(variable, table, (start, end), member=member,
+                             experiment=experiment, data_dir=data_dir, hot=hot)
+
+    # Periods that are not whole decades are read a couple of periods ahead
+    periods = periods_for(spec, [member], [experiment], data_dir)
+    fields = {}
+    for (start, end), mean in prefetch((p, partial(period_mean, *p))
+                                       for p in periods):
+        print(f"Processing {variable} {start}-{end}...")
+        fields[(experiment, "mean", start, end)] = mean - base
+    return fields
+
+
+def ensemble_anomaly_fields(spec, members, experiments, data_dir=DATA_DIR):
+    """
+    {(experiment, statistic, start, end): field} with ensemble mean, std and
+    percentiles of the period anomalies across members, for every experiment.
+    All periods are stacked lazily and reduced in one chunked pass.
+    """
+    variable, table = spec["variable"], spec["table"]
+    b0, b1 = spec["baseline"]
+
+    da = open_ensemble(variable, table, members, experiments, data_dir)
+    base = da.sel(time=slice(str(b0), str(b1))).mean("time")
+
+    periods = periods_for(spec, members, experiments, data_dir)
+    print(f"Reducing {variable}: {len(experiments)} experiment(s) × "
+          f"{len(members)} member(s) × {len(periods)} period(s)...")
+    anoms = xr.concat(
+        [da.sel(time=slice(str(s), str(e))).mean("time") - base
+         for s, e in periods],
+        dim=pd.Index(range(len(periods)), name="period"))
+    stats = ensemble_stats(anoms)
+
+    fields = {}
+    for name in stats.data_vars:
+        for experiment in experiments:
+            for i, (start, end) in enumerate(periods):
+                fields[(experiment, name, start, end)] = \
+                    stats[name].sel(experiment=experiment, period=i)
+    return fields
+
+
+# ------------------------------------------------------------------
+# Expand variants into render jobs
+# ------------------------------------------------------------------
+def jobs_for(spec, fields, figures_dir=FIGURES_DIR):
+    b0, b1 = spec["baseline"]
+    jobs = []
+    for variant in spec["variants"]:
+        opts = {**spec, **variant}
+        levels = np.linspace(*opts["levels"])
+        statistic = opts.get("statistic", "mean")
+        for (experiment, stat, start, end), anom in fields.items():
+            if stat != statistic:
+                continue
+            names = {"variable": spec["variable"], "experiment": experiment,
+                     "statistic": stat, "start": start, "end": end,
+                     "baseline_start": b0, "baseline_end": b1}
+            jobs.append(MapJob(
+                field=anom, levels=levels, cmap=opts["cmap"],
+                title=opts["title"].format(**names),
+                out_path=Path(figures_dir) / opts["output"].format(**names),
+                cbar_label=opts.get("cbar_label", "").format(**names),
+            ))
+    return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG)
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Render worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    members = config.get("members", [config.get("member", "r1i1p1f2")])
+    experiments = config.get("experiments",
+                             [config.get("experiment", "G6sulfur")])
+    ensemble = len(members) > 1 or len(experiments) > 1
+
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"Saving anomaly maps to: {FIGURES_DIR}\n")
+
+    jobs = []
+    for spec in config["figures"]:
+        if ensemble:
+            fields = ensemble_anomaly_fields(spec, members, experiments)
+        else:
+            fields = anomaly_fields(spec, members[0], experiments[0])
+        jobs += jobs_for(spec, fields)
+
+    print(f"\nRendering {len(jobs)} map(s)...")
+    render_jobs(jobs, args.processes)
+    print("\nAll anomaly maps saved!")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,329 @@
+# bench_pipeline.py
+"""
+Offline benchmark for the load → reduce → regrid → render pipeline.
+
+Generates synthetic CMIP-like NetCDF files – tas_Amon on a 192x288 lat/lon
+grid and tos_Omon on a 384x320 curvilinear grid – split into decadal files
+named like the real ESGF ones, then times each stage separately. The data
+is generated and every stage runs in its own spawned process, so the
+launcher stays small and each stage's memory is its own. On Linux the
+VmHWM high-water mark is reset at stage start (a spawned child otherwise
+inherits the parent's ru_maxrss); elsewhere the stage's growth over its
+startup RSS is the figure to trust. No ESGF access is needed.
+
+Results are written as JSON (one record per stage: wall/CPU seconds, peak
+RSS and its growth over startup) and can be compared against an earlier run
+to flag time and memory regressions.
+
+Usage:
+    python bench_pipeline.py                          # 2020–2049, results → bench_results.json
+    python bench_pipeline.py --years 2020 2099 --out new.json --compare old.json
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+TAS_SHAPE = (192, 288)
+TOS_SHAPE = (384, 320)
+SOURCE = "CESM2-WACCM"
+EXPERIMENT = "G6sulfur"
+MEMBER = "r1i1p1f2"
+
+STAGES = ("open_netcdf", "convert_zarr", "open_zarr", "reduce_per_decade",
+          "reduce_stream", "regrid_weights", "regrid_apply", "render_serial",
+          "render_pool")
+
+
+# ------------------------------------------------------------------
+# Synthetic data
+# ------------------------------------------------------------------
+def _time(start_year, end_year):
+    import xarray as xr
+    months = xr.date_range(f"{start_year}-01-01",
+                           periods=12 * (end_year - start_year + 1),
+                           freq="MS", calendar="noleap", use_cftime=True)
+    # CFTimeIndex adds datetime.timedelta, not np.timedelta64
+    return months + datetime.timedelta(days=14)     # mid-month, like CMIP6
+
+
+def _tas(time, rng):
+    import xarray as xr
+    lat = np.linspace(-90, 90, TAS_SHAPE[0])
+    lon = np.linspace(0, 360, TAS_SHAPE[1], endpoint=False)
+    base = 288 - 40 * np.sin(np.deg2rad(lat))[:, None] ** 2
+    data = (base[None] + rng.normal(0, 1, (len(time),) + TAS_SHAPE)
+            ).astype(np.float32)
+    return xr.Dataset(
+        {"tas": (("time", "lat", "lon"), data, {"units": "K"})},
+        coords={"time": time, "lat": lat, "lon": lon})
+
+
+def _tos(time, rng):
+    import xarray as xr
+    j, i = np.meshgrid(np.linspace(-79, 89, TOS_SHAPE[0]),
+                       np.linspace(0, 360, TOS_SHAPE[1], endpoint=False),
+                       indexing="ij")
+    # Gently distorted grid so lat/lon are genuinely 2-D
+    lat = j + 2 * np.sin(np.deg2rad(i))
+    lon = (i + 3 * np.cos(np.deg2rad(j))) % 360
+    land = (np.sin(np.deg2rad(lon * 3)) * np.cos(np.deg2rad(lat * 2))) > 0.6
+    base = 28 - 30 * np.sin(np.deg2rad(lat)) ** 2
+    data = base[None] + rng.normal(0, 0.5, (len(time),) + TOS_SHAPE)
+    data[:, land] = np.nan
+    return xr.Dataset(
+        {"tos": (("time", "nlat", "nlon"), data.astype(np.float32),
+                 {"units": "degC"})},
+        coords={"time": time, "lat": (("nlat", "nlon"), lat),
+                "lon": (("nlat", "nlon"), lon)})
+
+
+def generate(root, start_year, end_year, seed=0):
+    """Write decadal tas/tos files under root in an ESGF-like layout."""
+    rng = np.random.default_rng(seed)
+    for variable, table, make in (("tas", "Amon", _tas), ("tos", "Omon", _tos)):
+        folder = (Path(root) / "CMIP6" / "GeoMIP" / "NCAR" / SOURCE / EXPERIMENT
+                  / MEMBER / table / variable / "gn" / "v20200101")
+        folder.mkdir(parents=True, exist_ok=True)
+        for y0 in range(start_year, end_year + 1, 10):
+            y1 = min(y0 + 9, end_year)
+            name = (f"{variable}_{table}_{SOURCE}_{EXPERIMENT}_{MEMBER}_gn_"
+                    f"{y0}01-{y1}12.nc")
+            make(_time(y0, y1), rng).to_netcdf(folder / name)
+
+
+# ------------------------------------------------------------------
+# Stages – each runs in a fresh process
+# ------------------------------------------------------------------
+def _stage(name, work):
+    import xarray as xr
+
+    import catalog
+    import zarr_store
+    from regrid import regrid, regrid_weights
+    from render import MapJob, render_jobs
+    from stream_reduce import stream_reduce
+
+    data, stores = work / "data", work / "zarr"
+    regrid_dir, figs = work / "regrid", work / "figures"
+
+    def store(variable, table):
+        return xr.open_zarr(zarr_store.store_path(variable, table, MEMBER,
+                                                  EXPERIMENT, stores),
+                            consolidated=True)
+
+    def decades(da):
+        years = np.unique(da.time.dt.year.values // 10 * 10)
+        return [(str(y), str(y + 9)) for y in years]
+
+    if name == "open_netcdf":
+        paths = catalog.paths(catalog.find("tas", "Amon", data_dir=data))
+        ds = xr.open_mfdataset(paths, combine="nested", concat_dim="time",
+                               data_vars="minimal", coords="minimal",
+                               compat="override")
+        ds.sortby("time").tas.isel(time=0).load()
+    elif name == "convert_zarr":
+        for variable, table in (("tas", "Amon"), ("tos", "Omon")):
+            zarr_store.convert(variable, table, MEMBER, EXPERIMENT, data, stores)
+    elif name == "open_zarr":
+        store("tas", "Amon").tas.isel(time=0).load()
+    elif name == "reduce_per_decade":
+        da = store("tos", "Omon").tos
+        for y0, y1 in decades(da):
+            da.sel(time=slice(y0, y1)).mean("time").load()
+    elif name == "reduce_stream":
+        stream_reduce(store("tos", "Omon").tos, ("annual", "decadal",
+                                                 "baseline"))
+    elif name in ("regrid_weights", "regrid_apply"):
+        tos = store("tos", "Omon").tos
+        tas = store("tas", "Amon").tas.isel(time=0)
+        if name == "regrid_weights":
+            shutil.rmtree(regrid_dir, ignore_errors=True)
+            regrid_weights(tos.isel(time=0), tas, "bilinear",
+                           regrid_dir=regrid_dir)
+        else:
+            regrid_weights(tos.isel(time=0), tas, "bilinear",
+                           regrid_dir=regrid_dir)
+            regrid(tos, tas).load()
+    elif name in ("render_serial", "render_pool"):
+        da = store("tas", "Amon").tas
+        mean = da.mean("time").load()
+        jobs = [MapJob(field=da.sel(time=slice(y0, y1)).mean("time").load()
+                       - mean, levels=np.linspace(-1, 1, 21), cmap="RdBu_r",
+                       title=f"bench {y0}", out_path=figs / f"{name}_{y0}.png")
+                for y0, y1 in decades(da)]
+        render_jobs(jobs, processes=1 if name == "render_serial" else None)
+    else:
+        raise ValueError(f"Unknown stage '{name}'")
+
+
+def reset_peak_rss():
+    """Restart this process's VmHWM (Linux); False where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+    except ImportError:                       # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+
+def _child(name, work, queue):
+    # Make the repo modules importable in the spawned interpreter
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    reset_peak_rss()
+    rss0 = peak_rss_mb()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    _stage(name, Path(work))
+    peak = peak_rss_mb()
+    queue.put({"stage": name,
+               "wall_s": round(time.perf_counter() - wall0, 4),
+               "cpu_s": round(time.process_time() - cpu0, 4),
+               "peak_rss_mb": round(peak, 1),
+               "startup_rss_mb": round(rss0, 1),
+               "stage_rss_mb": round(peak - rss0, 1)})
+
+
+def _generate_child(root, start_year, end_year):
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    generate(root, start_year, end_year)
+
+
+def run_stage(name, work):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(name, str(work), queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        return {"stage": name, "error": f"exit code {proc.exitcode}"}
+    return queue.get()
+
+
+# ------------------------------------------------------------------
+# Compare
+# ------------------------------------------------------------------
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as fh:
+        old = {r["stage"]: r for r in json.load(fh)["stages"]}
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        o = old.get(r["stage"])
+        if not o or "wall_s" not in o or "wall_s" not in r:
+            continue
+        ratio = r["wall_s"] / max(o["wall_s"], 1e-9)
+        flag = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        # Memory is compared on the stage's own growth, not the raw peak;
+        # differences under 10 MB are noise
+        mem = ""
+        if "stage_rss_mb" in o and "stage_rss_mb" in r:
+            grew = r["stage_rss_mb"] - o["stage_rss_mb"]
+            mem = (f"  mem {o['stage_rss_mb']:7.0f} → "
+                   f"{r['stage_rss_mb']:7.0f} MB")
+            if grew > max(10.0, tolerance * o["stage_rss_mb"]):
+                flag = "REGRESSION"
+                mem += " (grew)"
+        regressions += flag != "ok"
+        print(f"  {r['stage']:18} {o['wall_s']:8.2f}s → {r['wall_s']:8.2f}s "
+              f"({ratio:5.2f}x){mem}  {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", nargs=2, type=int, default=(2020, 2049),
+                        metavar=("START", "END"))
+    parser.add_argument("--stages", nargs="+", choices=STAGES,
+                        default=list(STAGES))
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path,
+                        help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown before flagging (default 20%%)")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the synthetic data directory")
+    args = parser.parse_args(argv)
+
+    work = Path(tempfile.mkdtemp(prefix="met6155_bench_"))
+    # Keep the stage log out of the real one under CACHE_DIR; the spawned
+    # stage processes inherit this
+    if os.environ.get("MET6155_STAGE_LOG") != "off":
+        os.environ["MET6155_STAGE_LOG"] = str(work / "stages.jsonl")
+    try:
+        print(f"Generating synthetic data {args.years[0]}–{args.years[1]} "
+              f"in {work}...")
+        # In a child, so the launcher's peak RSS stays small
+        ctx = mp.get_context("spawn")
+        proc = ctx.Process(target=_generate_child,
+                           args=(str(work / "data"), *args.years))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            raise SystemExit(f"Data generation failed (exit code "
+                             f"{proc.exitcode})")
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        import catalog
+        catalog.scan(work / "data")
+
+        stages = list(args.stages)
+        # Stages that read Zarr need the stores from convert_zarr first
+        if "convert_zarr" not in stages and any(
+                s not in ("open_netcdf",) for s in stages):
+            stages.insert(0, "convert_zarr")
+
+        results = []
+        for name in stages:
+            print(f"  {name}...", end=" ", flush=True)
+            r = run_stage(name, work)
+            results.append(r)
+            print(r.get("error") or f"{r['wall_s']:.2f}s, "
+                                    f"peak {r['peak_rss_mb']:.0f} MB "
+                                    f"(+{r['stage_rss_mb']:.0f})")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    record = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "years": list(args.years),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              "stages": results}
+    with open(args.out, "w") as fh:
+        json.dump(record, fh, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
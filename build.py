@@ -0,0 +1,292 @@
+# build.py
+"""
+Incremental build of the derived products and figures.
+
+The pipeline is a small dependency graph:
+
+    catalog → store:<var> → reduce:<var> → figure:<var>:<start>
+                          → anomaly:<var>
+            → timeseries
+
+Every target records a fingerprint of its inputs in CACHE_DIR/build_state.json:
+the catalog checksums of the source files it reads, the code that builds it
+and (for figures) its config entry. A target is rebuilt only when that
+fingerprint changes or an output is missing; dependencies only fix the
+order. A Zarr output without consolidated metadata (an interrupted write)
+counts as missing. A figure depends only on the files overlapping its own
+period and baseline, so adding one decade file renders one new decade per
+variant, and re-downloading a corrected rsds file rebuilds only the rsds
+targets.
+
+Usage:
+    python build.py                       # bring everything up to date
+    python build.py --dry-run             # list what would be rebuilt
+    python build.py --only 'figure:tas:*' --force
+    python build.py --download            # sync ESGF first (data_download.py)
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import catalog
+from paths import CACHE_DIR, DATA_DIR
+
+STATE_PATH = CACHE_DIR / "build_state.json"
+HERE = Path(__file__).resolve().parent
+
+# name, dependency names (order only), input strings, output paths, action,
+# modules whose source is part of the fingerprint
+Target = namedtuple("Target", "name deps inputs outputs action code")
+
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()[:20]
+
+
+def code_hash(modules):
+    """Hash of the source files that build a target."""
+    return _hash(*((HERE / f"{m}.py").read_bytes() for m in modules))
+
+
+def files_fingerprint(entries, period=None):
+    """Fingerprint of the catalog entries, optionally only those in period."""
+    from zarr_store import fingerprint
+
+    if period is not None:
+        first, last = period
+        entries = [e for e in entries if catalog.start_year(e) <= last
+                   and catalog.end_year(e) >= first]
+    return fingerprint(entries)
+
+
+# ------------------------------------------------------------------
+# State
+# ------------------------------------------------------------------
+def load_state(path=STATE_PATH):
+    if Path(path).exists():
+        with open(path) as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_state(state, path=STATE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, indent=1)
+    tmp.replace(path)
+
+
+# ------------------------------------------------------------------
+# Graph
+# ------------------------------------------------------------------
+def graph(member="r1i1p1f2", experiment="G6sulfur", data_dir=DATA_DIR):
+    """All targets for one run, in dependency order."""
+    import anomaly_figures
+    import monthly_anomaly
+    import timeseries
+    from reduce_cache import reduce_stream, stream_path
+    from zarr_store import open_store, store_path
+
+    config = anomaly_figures.load_config()
+    baselines = {}
+    for spec in config["figures"]:
+        baselines.setdefault(spec["variable"], set()).add(tuple(spec["baseline"]))
+
+    targets = []
+    present = {}
+    for variable, table_id in monthly_anomaly.VARIABLES:
+        entries = catalog.find(variable, table_id, member=member,
+                               experiment=experiment, data_dir=data_dir)
+        if not entries:
+            continue
+        present[variable] = (table_id, entries)
+        fp = files_fingerprint(entries)
+
+        def build_store(v=variable, t=table_id):
+            open_store(v, t, member, experiment, data_dir=data_dir)
+
+        # The cached reductions the anomaly and figure targets read, one
+        # pass per baseline (reduce_stream serves subsets from these)
+        passes = {(2020, 2029): {"monthly_clim"}}
+        for b in baselines.get(variable, ()):
+            passes.setdefault(b, set()).update(("decadal", "baseline"))
+        reductions = [(tuple(sorted(g)), b) for b, g in sorted(passes.items())]
+
+        def build_reduce(v=variable, t=table_id, reductions=reductions):
+            for groupings, baseline in reductions:
+                reduce_stream(v, t, groupings=groupings, baseline=baseline,
+                              member=member, experiment=experiment,
+                              data_dir=data_dir)
+
+        def build_anomaly(v=variable, t=table_id):
+            monthly_anomaly.build(v, t, member, experiment, data_dir)
+
+        targets += [
+            Target(f"store:{variable}", [], [fp],
+                   [store_path(variable, table_id, member, experiment)],
+                   build_store, ["zarr_store"]),
+            Target(f"reduce:{variable}", [f"store:{variable}"],
+                   [fp, reductions],
+                   [stream_path(variable, table_id, g, b, member, experiment,
+                                data_dir) for g, b in reductions],
+                   build_reduce, ["reduce_cache", "stream_reduce",
+                                  "product_writer"]),
+            Target(f"anomaly:{variable}", [f"reduce:{variable}"], [fp],
+                   [monthly_anomaly.anomaly_path(variable, table_id, member,
+                                                 experiment)],
+                   build_anomaly, ["monthly_anomaly", "product_writer"]),
+        ]
+
+    series_vars = [(v, present[v][0]) for v, _ in timeseries.DEFAULT_VARIABLES
+                   if v in present]
+    if series_vars:
+        targets.append(Target(
+            "timeseries", [f"store:{v}" for v, _ in series_vars],
+            [files_fingerprint(present[v][1]) for v, _ in series_vars], [],
+            lambda: timeseries.open_table(series_vars, member, experiment,
+                                          data_dir),
+            ["timeseries", "spatial_mean"]))
+
+    targets += figure_targets(anomaly_figures, config, present, member,
+                              experiment)
+    return targets
+
+
+def figure_targets(anomaly_figures, config, present, member, experiment):
+    """One target per (figure spec, period); each renders all its variants."""
+    if "members" in config or "experiments" in config:
+        print("Ensemble figure config – figures are not tracked by build.py")
+        return []
+
+    targets = []
+    fields_cache = {}
+    for i, spec in enumerate(config["figures"]):
+        variable = spec["variable"]
+        if variable not in present:
+            continue
+        entries = present[variable][1]
+        baseline = tuple(spec["baseline"])
+        spec_hash = _hash(json.dumps(spec, sort_keys=True))
+
+        for start, end in anomaly_figures.periods_for(spec, [member],
+                                                      [experiment]):
+            jobs = anomaly_figures.jobs_for(
+                spec, {(experiment, "mean", start, end): None})
+            fp = _hash(files_fingerprint(entries, (start, end)),
+                       files_fingerprint(entries, baseline))
+
+            def render(i=i, spec=spec, start=start, end=end):
+                if i not in fields_cache:
+                    fields_cache[i] = anomaly_figures.anomaly_fields(
+                        spec, member, experiment)
+                key = (experiment, "mean", start, end)
+                return anomaly_figures.jobs_for(spec,
+                                                {key: fields_cache[i][key]})
+
+            name = f"figure:{variable}:{start}" + (f"#{i}" if i else "")
+            targets.append(Target(
+                name, [f"reduce:{variable}"],
+                [fp, spec_hash], [j.out_path for j in jobs], render,
+                ["anomaly_figures", "render", "reduce_cache"]))
+    return targets
+
+
+# ------------------------------------------------------------------
+# Run
+# ------------------------------------------------------------------
+def _complete(path):
+    """An output exists; a Zarr store also has its consolidated metadata."""
+    path = Path(path)
+    if path.suffix == ".zarr":
+        return (path / ".zmetadata").exists() or (path / "zarr.json").exists()
+    return path.exists()
+
+
+def plan(targets, state, only=None, force=False):
+    """{name: fingerprint} for every target, and the names that are dirty."""
+    fps, dirty = {}, []
+    for t in targets:
+        fp = _hash(*t.inputs, code_hash(t.code))
+        fps[t.name] = fp
+        selected = only is None or any(fnmatch.fnmatch(t.name, p)
+                                       for p in only)
+        stale = (state.get(t.name, {}).get("fingerprint") != fp
+                 or not all(_complete(o) for o in t.outputs))
+        if selected and (stale or force):
+            dirty.append(t.name)
+    return fps, dirty
+
+
+def run(targets, state, fps, dirty, processes=None, state_path=STATE_PATH):
+    from instrument import stage
+    from render import render_jobs
+
+    by_name = {t.name: t for t in targets}
+    jobs, pending = [], []
+    for name in dirty:
+        t = by_name[name]
+        print(f"[build] {name}")
+        with stage("build", target=name):
+            result = t.action()
+        if name.startswith("figure:"):
+            # Figures are rendered together at the end, in one worker pool
+            jobs += result
+            pending.append(name)
+            continue
+        state[name] = {"fingerprint": fps[name], "built": time.time()}
+        save_state(state, state_path)
+
+    if jobs:
+        print(f"\nRendering {len(jobs)} map(s)...")
+        render_jobs(jobs, processes)
+        for name in pending:
+            state[name] = {"fingerprint": fps[name], "built": time.time()}
+        save_state(state, state_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--member", default="r1i1p1f2")
+    parser.add_argument("--experiment", default="G6sulfur")
+    parser.add_argument("--only", nargs="+", metavar="PATTERN",
+                        help="Only targets matching these globs, e.g. 'figure:*'")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild the selected targets even if up to date")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--download", action="store_true",
+                        help="Run data_download.py (sync mode) first")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.download:
+        import data_download
+        data_download.main([])
+    # Cheap: one walk, checksums come from the download stamps
+    catalog.scan(DATA_DIR)
+
+    targets = graph(args.member, args.experiment)
+    state = load_state()
+    fps, dirty = plan(targets, state, args.only, args.force)
+    print(f"{len(targets)} target(s), {len(dirty)} to rebuild")
+    if args.dry_run:
+        for name in dirty:
+            print(f"  {name}")
+        return 0
+    run(targets, state, fps, dirty, args.processes)
+    print("\nUp to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,222 @@
+# catalog.py
+"""
+Local catalog of downloaded CMIP6 files.
+
+A small SQLite index (DATA_DIR/catalog.sqlite) written once at download time,
+so the analysis and plotting scripts can look up their inputs by
+variable/table/member/experiment instead of walking the data tree with
+recursive globs and parsing years out of filenames.
+
+Usage:
+    python catalog.py scan                 # (re)index everything under DATA_DIR
+    python catalog.py list --variable tas
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from contextlib import closing
+from pathlib import Path
+
+from instrument import stage
+from paths import DATA_DIR
+
+CATALOG_NAME = "catalog.sqlite"
+
+COLUMNS = ("variable", "table_id", "source", "experiment", "member", "grid",
+           "start", "end", "path", "size", "sha")
+
+Entry = namedtuple("Entry", COLUMNS)
+
+# tas_Amon_CESM2-WACCM_G6sulfur_r1i1p1f2_gn_202001-202912.nc
+FILENAME_RE = re.compile(
+    r"^(?P<variable>[^_]+)_(?P<table_id>[^_]+)_(?P<source>[^_]+)_"
+    r"(?P<experiment>[^_]+)_(?P<member>[^_]+)_(?P<grid>[^_]+)"
+    r"(?:_(?P<start>\d+)-(?P<end>\d+))?\.nc$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    variable   TEXT NOT NULL,
+    table_id   TEXT NOT NULL,
+    source     TEXT NOT NULL,
+    experiment TEXT NOT NULL,
+    member     TEXT NOT NULL,
+    grid       TEXT NOT NULL,
+    start      TEXT,
+    end        TEXT,
+    path       TEXT PRIMARY KEY,
+    size       INTEGER,
+    sha        TEXT
+);
+CREATE INDEX IF NOT EXISTS files_lookup
+    ON files (variable, table_id, experiment, member);
+"""
+
+
+def start_year(entry):
+    return int(entry.start[:4])
+
+
+def end_year(entry):
+    return int(entry.end[:4])
+
+
+def parse_filename(name):
+    """Split a CMIP6 filename into its facets, or None if it isn't one."""
+    m = FILENAME_RE.match(name)
+    return m.groupdict() if m else None
+
+
+# ------------------------------------------------------------------
+# Database
+# ------------------------------------------------------------------
+def catalog_path(data_dir=DATA_DIR):
+    return Path(data_dir) / CATALOG_NAME
+
+
+def connect(data_dir=DATA_DIR):
+    """
+    A new connection. Use as `with closing(connect()) as con, con:` – the
+    connection's own context manager only commits, it does not close.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    con = sqlite3.connect(catalog_path(data_dir))
+    con.executescript(SCHEMA)
+    return con
+
+
+def _insert(con, entries):
+    con.executemany(
+        f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+        [tuple(e) for e in entries])
+
+
+def add_entries(entries, data_dir=DATA_DIR):
+    with closing(connect(data_dir)) as con, con:
+        _insert(con, entries)
+    return len(entries)
+
+
+def entry_for(path, sha=None):
+    path = Path(path)
+    facets = parse_filename(path.name)
+    if facets is None:
+        return None
+    return Entry(path=str(path), size=path.stat().st_size, sha=sha, **facets)
+
+
+# ------------------------------------------------------------------
+# Writers
+# ------------------------------------------------------------------
+def record_downloads(downloads, data_dir=DATA_DIR):
+    """Index (path, checksum) pairs for files that are present on disk."""
+    entries = []
+    for path, sha in downloads:
+        if Path(path).exists():
+            entry = entry_for(path, sha)
+            if entry is not None:
+                entries.append(entry)
+    n = add_entries(entries, data_dir)
+    print(f"Catalog: recorded {n} file(s) in {catalog_path(data_dir)}")
+    return n
+
+
+def scan(data_dir=DATA_DIR):
+    """Rebuild the catalog from one walk of the data tree."""
+    verified = {}
+    stamps = Path(data_dir) / ".verified.json"
+    if stamps.exists():
+        with open(stamps) as fh:
+            verified = {k: v["checksum"] for k, v in json.load(fh).items()}
+
+    entries = []
+    with stage("discovery", what="catalog scan"):
+        for root, _, names in os.walk(data_dir):
+            for name in names:
+                if not name.endswith(".nc"):
+                    continue
+                path = os.path.join(root, name)
+                entry = entry_for(path, verified.get(path))
+                if entry is not None:
+                    entries.append(entry)
+
+    # One transaction: readers see the old or the new index, never an
+    # empty one, and a failed insert leaves the old index in place
+    with closing(connect(data_dir)) as con, con:
+        con.execute("DELETE FROM files")
+        _insert(con, entries)
+    n = len(entries)
+    print(f"Catalog: indexed {n} file(s) under {data_dir}")
+    return n
+
+
+# ------------------------------------------------------------------
+# Queries
+# ------------------------------------------------------------------
+def find(variable=None, table_id=None, member=None, experiment=None,
+         grid=None, source=None, data_dir=DATA_DIR):
+    """Catalog entries matching the given facets, ordered by start date."""
+    if not catalog_path(data_dir).exists():
+        scan(data_dir)
+
+    facets = {"variable": variable, "table_id": table_id, "member": member,
+              "experiment": experiment, "grid": grid, "source": source}
+    where = [(k, v) for k, v in facets.items() if v is not None]
+    sql = f"SELECT {', '.join(COLUMNS)} FROM files"
+    if where:
+        sql += " WHERE " + " AND ".join(f"{k} = ?" for k, _ in where)
+    sql += " ORDER BY variable, table_id, experiment, member, start"
+
+    with closing(connect(data_dir)) as con:
+        rows = con.execute(sql, [v for _, v in where]).fetchall()
+    return [Entry(*row) for row in rows]
+
+
+def paths(entries):
+    return [e.path for e in entries]
+
+
+def datasets(data_dir=DATA_DIR):
+    """Distinct (variable, table_id, member, experiment) combinations."""
+    if not catalog_path(data_dir).exists():
+        scan(data_dir)
+    with closing(connect(data_dir)) as con:
+        return con.execute(
+            "SELECT DISTINCT variable, table_id, member, experiment "
+            "FROM files ORDER BY variable, table_id, experiment, member"
+        ).fetchall()
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("scan", "list"))
+    parser.add_argument("--variable")
+    parser.add_argument("--table", dest="table_id")
+    parser.add_argument("--member")
+    parser.add_argument("--experiment")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        scan(args.data_dir)
+        return 0
+
+    entries = find(args.variable, args.table_id, args.member, args.experiment,
+                   data_dir=args.data_dir)
+    for e in entries:
+        period = f"{e.start}-{e.end}" if e.start is not None else "fx"
+        print(f"{e.variable:6} {e.table_id:5} {e.experiment:10} {e.member:10} "
+              f"{period}  {Path(e.path).name}")
+    print(f"{len(entries)} file(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
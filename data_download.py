@@ -0,0 +1,459 @@
+# data_download.py
+"""
+Shared CMIP6 downloader for the G6sulfur project.
+
+Replaces data_tas.py / data_tos.py / data_rsds.py. Every requested
+(variable_id, table_id, member_id, experiment_id) spec is turned into an
+esgpull Query, all queries are resolved together, their file lists are merged
+and everything is downloaded in a single event loop.
+
+Usage:
+    python data_download.py                                  # tas + tos + rsds
+    python data_download.py --spec tas:Amon:r1i1p1f2:G6sulfur \
+                            --spec tos:Omon:r2i1p1f2:G6solar --max-concurrent 8
+    python data_download.py --dry-run                        # plan only
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# esgpull and httpx are imported where they are used, so --help and
+# --dry-run planning do not pay for them up front
+
+import search_cache
+from catalog import record_downloads
+from instrument import stage
+from paths import DATA_DIR
+
+# ----------------------------
+# Defaults
+# ----------------------------
+PROJECT = "CMIP6"
+ACTIVITY_ID = "GeoMIP"
+SOURCE_ID = "CESM2-WACCM"
+GRID_LABEL = "gn"
+
+Spec = namedtuple("Spec", "variable_id table_id member_id experiment_id")
+
+DEFAULT_SPECS = [
+    Spec("tas", "Amon", "r1i1p1f2", "G6sulfur"),
+    Spec("tos", "Omon", "r1i1p1f2", "G6sulfur"),
+    Spec("rsds", "Amon", "r1i1p1f2", "G6sulfur"),
+]
+
+
+def parse_spec(text):
+    """Parse 'variable:table:member:experiment' into a Spec."""
+    parts = text.split(":")
+    if len(parts) != 4 or not all(parts):
+        raise argparse.ArgumentTypeError(
+            f"Bad spec '{text}' – expected variable:table:member:experiment")
+    return Spec(*parts)
+
+
+# ----------------------------
+# Initialize Esgpull
+# ----------------------------
+def init_esgpull(data_dir=DATA_DIR, max_concurrent=None, index_node=None):
+    from esgpull import Esgpull
+
+    os.makedirs(data_dir, exist_ok=True)
+    esg = Esgpull()
+    esg.config.paths.data = str(data_dir)   # ← MUST BE BEFORE ANY QUERY
+    if max_concurrent:
+        esg.config.download.max_concurrent = max_concurrent
+    if index_node:
+        # e.g. the local stand-in: http://127.0.0.1:8765/esg-search/search
+        esg.config.api.index_node = index_node
+    return esg
+
+
+# ----------------------------
+# Build Query
+# ----------------------------
+def build_query(spec):
+    from esgpull import Query
+
+    q = Query()
+    q.selection.project = PROJECT
+    q.selection.activity_id = ACTIVITY_ID
+    q.selection.source_id = SOURCE_ID
+    q.selection.experiment_id = spec.experiment_id
+    q.selection.variable_id = spec.variable_id
+    q.selection.table_id = spec.table_id
+    q.selection.grid_label = GRID_LABEL
+    q.selection.member_id = spec.member_id  # Prevents file_id collision
+    return q
+
+
+# ----------------------------
+# Search – all queries in one go
+# ----------------------------
+def resolve(esg, specs, use_cache=True, refresh=False, ttl=search_cache.TTL):
+    """
+    Search every spec at once and return the merged, de-duplicated files.
+    Results come from the search cache unless use_cache is False.
+    """
+    queries = [build_query(spec) for spec in specs]
+
+    print(f"Searching {len(queries)} spec(s)...")
+    with stage("discovery", what="esgf search", specs=len(queries)):
+        if use_cache:
+            dataset_ids, hits = search_cache.search(esg, queries, ttl,
+                                                    refresh)
+        else:
+            dataset_ids = [ds.dataset_id
+                           for ds in esg.context.datasets(*queries)]
+            hits = esg.context.files(*queries)
+    print(f"Found {len(dataset_ids)} dataset(s):")
+    for dataset_id in dataset_ids:
+        print(f"  - {dataset_id}")
+
+    files = {}
+    for file in hits:
+        files.setdefault(file.file_id, file)
+    files = sorted(files.values(), key=lambda f: f.file_id)
+    print(f"Found {len(files)} file(s) across all specs")
+    return standin_urls(files, esg.config.api.index_node)
+
+
+def standin_urls(files, index_node):
+    """
+    Point file URLs served by a plain-HTTP index node (the local stand-in,
+    esgf_standin.py) back to http://. esgpull upgrades every search result
+    URL to https://, which the stand-in does not speak.
+    """
+    index_node = str(index_node or "")
+    if not index_node.startswith("http://"):
+        return files
+    host = urlsplit(index_node).netloc
+    for file in files:
+        url = urlsplit(file.url)
+        if url.scheme == "https" and url.netloc == host:
+            file.url = url._replace(scheme="http").geturl()
+    return files
+
+
+def local_file(file, data_dir=DATA_DIR):
+    """Final on-disk location of a File under the esgpull data directory."""
+    return Path(data_dir) / file.local_path / file.filename
+
+
+TMP_DIR = Path.home() / ".esgpull" / "tmp"
+
+
+def tmp_file(file, suffix):
+    return TMP_DIR / f"{file.sha}{suffix}"
+
+
+# ----------------------------
+# Checksums – remembered per (path, size, mtime) so re-runs don't re-hash
+# ----------------------------
+VERIFIED_NAME = ".verified.json"
+
+
+def file_checksum(path, checksum_type="SHA256", block=8 << 20):
+    h = hashlib.new((checksum_type or "SHA256").lower())
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_verified(data_dir=DATA_DIR):
+    path = Path(data_dir) / VERIFIED_NAME
+    if path.exists():
+        with open(path) as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_verified(stamps, data_dir=DATA_DIR):
+    path = Path(data_dir) / VERIFIED_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(stamps, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_verified(file, path, stamps):
+    """True if `path` matches the remote size and checksum of `file`."""
+    if not path.exists():
+        return False
+    st = path.stat()
+    if file.size and st.st_size != file.size:
+        return False
+    if not file.checksum:
+        return True
+    key = str(path)
+    stamp = stamps.get(key)
+    if (stamp and stamp["size"] == st.st_size
+            and stamp["mtime"] == st.st_mtime
+            and stamp["checksum"] == file.checksum):
+        return True
+    if file_checksum(path, file.checksum_type) != file.checksum:
+        return False
+    stamp_verified(stamps, file, path)
+    return True
+
+
+def stamp_verified(stamps, file, path):
+    """Remember that `path` (as it is now) matches file.checksum."""
+    st = Path(path).stat()
+    stamps[str(path)] = {"size": st.st_size, "mtime": st.st_mtime,
+                         "checksum": file.checksum}
+
+
+# ----------------------------
+# Incremental sync plan
+# ----------------------------
+def plan_sync(files, data_dir=DATA_DIR, dry_run=False):
+    """
+    Split files into (verified, resumable, missing).
+
+    verified  – already under data_dir with matching size + checksum
+    resumable – a partial {sha}.part in the esgpull tmp dir, shorter than the
+                remote file, that can be continued with an HTTP range request
+    missing   – absent or corrupt; fetched from scratch
+
+    Corrupt files are deleted and new checksum stamps saved, unless dry_run
+    is set – a dry run leaves everything on disk as it was.
+    """
+    stamps = load_verified(data_dir)
+    verified, resumable, missing = [], [], []
+    for file in files:
+        path = local_file(file, data_dir)
+        if is_verified(file, path, stamps):
+            verified.append(file)
+            continue
+        if path.exists():
+            print(f"  [Corrupt] {file.filename} – will re-download")
+            if not dry_run:
+                path.unlink()
+        part = tmp_file(file, ".part") if file.sha else None
+        if (part and file.size and part.exists()
+                and 0 < part.stat().st_size < file.size):
+            resumable.append(file)
+        else:
+            missing.append(file)
+    if not dry_run:
+        save_verified(stamps, data_dir)
+    return verified, resumable, missing
+
+
+# ----------------------------
+# Clean old DB entries and stale .part/.done files
+# ----------------------------
+def clean_stale(esg, files, keep_parts=False):
+    """Drop DB rows and temp files for `files` so esgpull refetches them."""
+    if not files:
+        return
+    from esgpull.models import File
+
+    file_ids = [f.file_id for f in files]
+    with esg.db.session as session:
+        deleted = session.query(File).filter(
+            File.file_id.in_(file_ids)
+        ).delete(synchronize_session=False)
+        session.commit()
+    print(f"Removed {deleted} old record(s).")
+
+    os.makedirs(TMP_DIR, exist_ok=True)
+
+    suffixes = (".done",) if keep_parts else (".part", ".done")
+    cleaned = 0
+    for file in files:
+        if not file.sha:
+            continue
+        for suffix in suffixes:
+            stale = tmp_file(file, suffix)
+            if stale.exists():
+                try:
+                    stale.unlink()
+                    cleaned += 1
+                except Exception as e:
+                    print(f"  Warning: Could not delete {stale}: {e}")
+    if cleaned:
+        print(f"Cleaned {cleaned} stale temp file(s).")
+
+
+# ----------------------------
+# Resume partial downloads with HTTP range requests
+# ----------------------------
+WRITE_BLOCK = 8 << 20    # bytes buffered per write on the worker thread
+
+
+async def resume_one(client, file, data_dir, sem):
+    # Disk writes and the checksum run in threads so the other streams in
+    # the same event loop keep reading (and don't hit http_timeout)
+    part = tmp_file(file, ".part")
+    async with sem:
+        offset = part.stat().st_size
+        headers = {"Range": f"bytes={offset}-"}
+        async with client.stream("GET", file.url, headers=headers) as resp:
+            if resp.status_code != 206:
+                raise RuntimeError(
+                    f"server ignored range request (HTTP {resp.status_code})")
+            with open(part, "ab") as fh:
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    buf += chunk
+                    if len(buf) >= WRITE_BLOCK:
+                        await asyncio.to_thread(fh.write, bytes(buf))
+                        buf.clear()
+                if buf:
+                    await asyncio.to_thread(fh.write, bytes(buf))
+
+    if file.checksum and await asyncio.to_thread(
+            file_checksum, part, file.checksum_type) != file.checksum:
+        part.unlink()
+        raise RuntimeError("checksum mismatch after resume")
+    path = local_file(file, data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(part, path)
+    return file
+
+
+async def fetch_all(esg, missing, resumable, data_dir):
+    """Resume partial files and download missing ones in one event loop."""
+    import httpx
+
+    sem = asyncio.Semaphore(esg.config.download.max_concurrent)
+    failed = []
+    async with httpx.AsyncClient(follow_redirects=True,
+                                 timeout=esg.config.download.http_timeout) as client:
+        results = await asyncio.gather(
+            *(resume_one(client, f, data_dir, sem) for f in resumable),
+            return_exceptions=True)
+        resumed = []
+        for file, res in zip(resumable, results):
+            if isinstance(res, Exception):
+                print(f"  [Resume failed] {file.filename}: {res}")
+                failed.append(file)
+            else:
+                print(f"  [Resumed] {file.filename}")
+                resumed.append(file)
+        # Already hashed above – stamp them so the next sync doesn't re-hash
+        if any(f.checksum for f in resumed):
+            stamps = load_verified(data_dir)
+            for file in resumed:
+                if file.checksum:
+                    stamp_verified(stamps, file, local_file(file, data_dir))
+            save_verified(stamps, data_dir)
+
+        # Anything that could not be resumed goes through esgpull from scratch
+        queue = missing + failed
+        if failed:
+            clean_stale(esg, failed)
+        downloaded, errors = [], []
+        if queue:
+            downloaded, errors = await esg.download(queue)
+    return downloaded, errors
+
+
+# ----------------------------
+# Download – single event loop
+# ----------------------------
+def download(esg, files, resumable=(), data_dir=DATA_DIR):
+    resumable = list(resumable)
+    print(f"\nDownloading {len(files)} file(s), resuming {len(resumable)} "
+          f"(max {esg.config.download.max_concurrent} concurrent)...")
+    with stage("download", files=len(files), resumed=len(resumable)):
+        downloaded, errors = asyncio.run(
+            fetch_all(esg, list(files), resumable, data_dir))
+    for err in errors:
+        print(f"  [Failed] {err.data.filename}: {err.err}")
+    return downloaded, errors
+
+
+def verify(files, data_dir=DATA_DIR):
+    print("\nVerifying files in target folder...")
+    present = 0
+    for f in files:
+        path = local_file(f, data_dir)
+        if path.exists():
+            present += 1
+        else:
+            print(f"  [Missing] {f.filename} → expected at {path}")
+    print(f"{present} / {len(files)} files in {data_dir}")
+    return present
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--spec", action="append", type=parse_spec,
+                        dest="specs", metavar="VAR:TABLE:MEMBER:EXPERIMENT",
+                        help="Repeat for each variable/member/experiment "
+                             "(default: tas, tos and rsds for G6sulfur "
+                             "r1i1p1f2)")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Maximum simultaneous file downloads")
+    parser.add_argument("--mode", choices=("sync", "fresh"), default="sync",
+                        help="sync: skip verified files and resume .part "
+                             "files (default); fresh: wipe records and temp "
+                             "files and download everything again")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="Always search the index node")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Search again and overwrite the cached result")
+    parser.add_argument("--search-ttl", type=float, default=search_cache.TTL / 3600,
+                        help="Hours before a cached search is re-checked "
+                             "(default: %(default)s)")
+    parser.add_argument("--index-node",
+                        help="Search URL, e.g. the esgf_standin.py server")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Search and report what would be fetched, "
+                             "without touching local files")
+    args = parser.parse_args(argv)
+
+    specs = args.specs or DEFAULT_SPECS
+    esg = init_esgpull(args.data_dir, args.max_concurrent, args.index_node)
+
+    files = resolve(esg, specs, args.use_cache, args.refresh,
+                    args.search_ttl * 3600)
+    if not files:
+        print("No files to download.")
+        return 1
+
+    if args.dry_run:
+        verified, resumable, todo = plan_sync(files, args.data_dir,
+                                              dry_run=True)
+        for label, group in (("resume", resumable), ("fetch", todo)):
+            for f in group:
+                print(f"  [{label}] {f.filename} ({(f.size or 0) / 1e6:.1f} MB)")
+        print(f"\nDry run: {len(verified)} verified, {len(resumable)} "
+              f"resumable, {len(todo)} to fetch")
+        return 0
+
+    if args.mode == "fresh":
+        print("\nCleaning stale records and temp files...")
+        clean_stale(esg, files)
+        todo, resumable = files, []
+    else:
+        print("\nChecking local files...")
+        verified, resumable, todo = plan_sync(files, args.data_dir)
+        print(f"{len(verified)} verified, {len(resumable)} resumable, "
+              f"{len(todo)} to fetch")
+        clean_stale(esg, todo)
+        clean_stale(esg, resumable, keep_parts=True)
+
+    if todo or resumable:
+        download(esg, todo, resumable, args.data_dir)
+    present = verify(files, args.data_dir)
+    record_downloads([(local_file(f, args.data_dir), f.checksum)
+                      for f in files], args.data_dir)
+    return 0 if present == len(files) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
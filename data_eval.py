@@ -1,142 +1,261 @@
 # data_eval.py
+"""
+Global-mean tas/rsds time series and 2020–2029 maps for G6sulfur r1i1p1f2.
+
+Usage:
+    python data_eval.py
+    python data_eval.py --distributed --workers 8 --threads-per-worker 4 \
+                        --memory-limit 6GB --report dask-report.html
+    python data_eval.py --members r1i1p1f2 r2i1p1f2 r3i1p1f2 \
+                        --experiments G6sulfur G6solar ssp585 ssp245
+"""
+import argparse
 import os
-import glob
-import xarray as xr
+from contextlib import nullcontext
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import pandas as pd
-import numpy as np
+import dask
+
+import catalog
+from paths import DATA_DIR, FIGURES_DIR
+from ensemble import ensemble_stats, open_ensemble
+from instrument import stage
+from spatial_mean import global_mean
+from timeseries import open_table
+from zarr_store import open_store
 
 # ------------------------------------------------------------------
-# 1. BASE PATH – CHANGE ONLY THIS
+# 1. BASE PATH – set in paths.py
 # ------------------------------------------------------------------
-BASE = r"D:\school\MET6155\final_project\data"
+BASE = DATA_DIR
+
+
+def plot_map(da, title, cmap, vmin, vmax):
+    fig, ax = plt.subplots(figsize=(10, 5), subplot_kw={
+                           'projection': ccrs.PlateCarree()})
+    da.plot.contourf(ax=ax, transform=ccrs.PlateCarree(),
+                     cmap=cmap, vmin=vmin, vmax=vmax,
+                     cbar_kwargs={'label': da.units})
+    ax.coastlines()
+    ax.set_title(title)
+    plt.show()
+
 
 # ------------------------------------------------------------------
-# 2. SEARCH FOR FILES (CORRECT PATHS!)
+# Ensemble mode: many members × experiments
 # ------------------------------------------------------------------
-# tas files are in: data/CMIP6/.../tas/...
-tas_pattern = os.path.join(BASE, "CMIP6", "**", "tas_Amon_*.nc")
+def ensemble_eval(args, chunks):
+    """
+    {variable: (stats, ylabel)} – ensemble mean ± spread of the global-mean
+    series per experiment, computed (see plot_ensemble for the figures).
+    """
+    results = {}
+    for variable, ylabel in (("tas", "Temperature (K)"),
+                             ("rsds", "Shortwave (W m⁻²)")):
+        try:
+            da = open_ensemble(variable, "Amon", args.members,
+                               args.experiments, data_dir=BASE, chunks=chunks)
+        except FileNotFoundError as e:
+            print(f"Warning: {e} – skipping")
+            continue
 
-# rsds files are in: data/rsds/CMIP6/.../rsds/...
-rsds_pattern = os.path.join(BASE, "rsds", "CMIP6", "**", "rsds_Amon_*.nc")
+        print(f"\n{variable}: {da.sizes['experiment']} experiment(s) × "
+              f"{da.sizes['member']} member(s)")
+        with stage("compute", what="ensemble global mean", variable=variable):
+            results[variable] = (ensemble_stats(global_mean(da, "Amon")),
+                                 ylabel)
+    return results
 
-# Use recursive search
-tas_files = sorted(glob.glob(tas_pattern,  recursive=True))
-rsds_files = sorted(glob.glob(rsds_pattern, recursive=True))
 
-print(f"tas  files: {len(tas_files)}")
-print(f"rsds files: {len(rsds_files)}")
+def plot_ensemble(results):
+    for variable, (stats, ylabel) in results.items():
+        fig, ax = plt.subplots(figsize=(11, 5))
+        for experiment in stats.experiment.values:
+            s = stats.sel(experiment=experiment)
+            years = s.time.dt.year + (s.time.dt.month - 0.5) / 12
+            line, = ax.plot(years, s["mean"], label=str(experiment))
+            ax.fill_between(years, s["p05"], s["p95"],
+                            color=line.get_color(), alpha=0.2)
+        ax.set_ylabel(ylabel)
+        ax.set_title(f"{variable} global mean – ensemble mean and 5–95% range")
+        ax.legend()
+        ax.grid(alpha=0.3)
+        plt.show()
 
-# Show first file of each
-if tas_files:
-    print("  tas example:", os.path.basename(tas_files[0]))
-if rsds_files:
-    print("  rsds example:", os.path.basename(rsds_files[0]))
-else:
-    print("  rsds NOT FOUND – check path!")
 
 # ------------------------------------------------------------------
-# 3. OPEN tas – SORT TIME MANUALLY (fixes monotonic error)
+# Distributed execution
 # ------------------------------------------------------------------
-if not tas_files:
-    raise FileNotFoundError("No tas files found")
-
-print("\nOpening tas files... (sorting time)")
-ds_tas = xr.open_mfdataset(
-    tas_files,
-    combine='by_coords',
-    parallel=True,
-    concat_dim='time',
-    data_vars='minimal',
-    coords='minimal',
-    compat='override'
-)
-
-# CRITICAL: Sort time explicitly
-ds_tas = ds_tas.sortby('time')
+def start_cluster(args):
+    from dask.distributed import Client, LocalCluster
 
-# ------------------------------------------------------------------
-# 4. OPEN rsds – same fix
-# ------------------------------------------------------------------
-if rsds_files:
-    print("Opening rsds files... (sorting time)")
-    ds_rsds = xr.open_mfdataset(
-        rsds_files,
-        combine='by_coords',
-        parallel=True,
-        concat_dim='time',
-        data_vars='minimal',
-        coords='minimal',
-        compat='override'
-    )
-    ds_rsds = ds_rsds.sortby('time')
-else:
-    ds_rsds = None
-    print("Warning: rsds not found – skipping rsds plots")
+    cluster = LocalCluster(n_workers=args.workers,
+                           threads_per_worker=args.threads_per_worker,
+                           memory_limit=args.memory_limit)
+    client = Client(cluster)
+    print(f"Dask cluster: {len(cluster.workers)} worker(s) × "
+          f"{args.threads_per_worker} thread(s) – dashboard {client.dashboard_link}")
+    return cluster, client
 
-# ------------------------------------------------------------------
-# 5. Inspect
-# ------------------------------------------------------------------
-print(f"\ntas time:  {ds_tas.time.min().values} → {ds_tas.time.max().values}")
-if ds_rsds:
-    print(
-        f"rsds time: {ds_rsds.time.min().values} → {ds_rsds.time.max().values}")
 
-# ------------------------------------------------------------------
-# 6. Global mean
-# ------------------------------------------------------------------
+def stop_cluster(cluster, client):
+    """Shut down the client and the workers (None-safe)."""
+    if client is not None:
+        client.close()
+    if cluster is not None:
+        cluster.close()
 
 
-def global_mean(da):
-    weights = np.cos(np.deg2rad(da.lat))
-    return da.weighted(weights).mean(dim=['lon', 'lat'])
+def report_context(args):
+    if not args.distributed or not args.report:
+        return nullcontext()
+    from dask.distributed import performance_report
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    return performance_report(filename=str(args.report))
 
 
-tas_gm = global_mean(ds_tas.tas)
+def evaluate(args, chunks):
+    """(global-mean DataFrame, {variable: 2020–2029 map}) for one run."""
+    # ------------------------------------------------------------------
+    # 2. LOOK UP FILES IN THE CATALOG
+    # ------------------------------------------------------------------
+    with stage("discovery", what="catalog lookup"):
+        tas_files = catalog.paths(catalog.find(
+            "tas", "Amon", member="r1i1p1f2", experiment="G6sulfur", data_dir=BASE))
+        rsds_files = catalog.paths(catalog.find(
+            "rsds", "Amon", member="r1i1p1f2", experiment="G6sulfur", data_dir=BASE))
 
-df = pd.DataFrame({'tas': tas_gm}).to_dataframe()
+    print(f"tas  files: {len(tas_files)}")
+    print(f"rsds files: {len(rsds_files)}")
 
-if ds_rsds:
-    rsds_gm = global_mean(ds_rsds.rsds)
-    df['rsds'] = rsds_gm
+    # Show first file of each
+    if tas_files:
+        print("  tas example:", os.path.basename(tas_files[0]))
+    if rsds_files:
+        print("  rsds example:", os.path.basename(rsds_files[0]))
+    else:
+        print("  rsds NOT FOUND – run data_download.py / catalog.py scan")
 
-# ------------------------------------------------------------------
-# 7. Plot time series
-# ------------------------------------------------------------------
+    # ------------------------------------------------------------------
+    # 3. OPEN tas – consolidated Zarr store (time already sorted)
+    # ------------------------------------------------------------------
+    if not tas_files:
+        raise FileNotFoundError("No tas files found")
 
+    print("\nOpening tas store...")
+    ds_tas = open_store("tas", "Amon", "r1i1p1f2", "G6sulfur", data_dir=BASE,
+                        chunks=chunks)
 
-ax = df.plot(
-    title='G6sulfur r1i1p1f2 – Global Mean (2020–2100)',
-    secondary_y='rsds' if 'rsds' in df else None,
-    figsize=(11, 5)
-)
-ax.left_axis.set_ylabel('Temperature (K)')
-if 'rsds' in df:
-    ax.right_axis.set_ylabel('Shortwave (W m⁻²)')
-plt.axvline('2070-01-01', color='gray', linestyle='--', label='rsds gap')
-plt.show()
+    # ------------------------------------------------------------------
+    # 4. OPEN rsds
+    # ------------------------------------------------------------------
+    if rsds_files:
+        print("Opening rsds store...")
+        ds_rsds = open_store("rsds", "Amon", "r1i1p1f2", "G6sulfur",
+                             data_dir=BASE, chunks=chunks)
+    else:
+        ds_rsds = None
+        print("Warning: rsds not found – skipping rsds plots")
 
-# ------------------------------------------------------------------
-# 8. Map: 2020–2029
-# ------------------------------------------------------------------
-dec = slice('2020-01-01', '2029-12-31')
-tas_dec = ds_tas.tas.sel(time=dec).mean('time')
+    # ------------------------------------------------------------------
+    # 5. Inspect
+    # ------------------------------------------------------------------
+    print(f"\ntas time:  {ds_tas.time.min().values} → {ds_tas.time.max().values}")
+    if ds_rsds:
+        print(
+            f"rsds time: {ds_rsds.time.min().values} → {ds_rsds.time.max().values}")
 
+    # ------------------------------------------------------------------
+    # 6. Global mean – one fused pass for all variables, cached as a table
+    # ------------------------------------------------------------------
+    variables = [("tas", "Amon")] + ([("rsds", "Amon")] if ds_rsds else [])
+    df = open_table(variables, "r1i1p1f2", "G6sulfur", data_dir=BASE,
+                    chunks=chunks)
 
-def plot_map(da, title, cmap, vmin, vmax):
-    fig, ax = plt.subplots(figsize=(10, 5), subplot_kw={
-                           'projection': ccrs.PlateCarree()})
-    da.plot.contourf(ax=ax, transform=ccrs.PlateCarree(),
-                     cmap=cmap, vmin=vmin, vmax=vmax,
-                     cbar_kwargs={'label': da.units})
-    ax.coastlines()
-    ax.set_title(title)
+    # ------------------------------------------------------------------
+    # 7. Map: 2020–2029 (reduced here, plotted below)
+    # ------------------------------------------------------------------
+    dec = slice('2020-01-01', '2029-12-31')
+    maps = {'tas': ds_tas.tas.sel(time=dec).mean('time')}
+    if ds_rsds:
+        maps['rsds'] = ds_rsds.rsds.sel(time=dec).mean('time')
+    with stage("compute", what="2020s maps"):
+        maps = dict(zip(maps, dask.compute(*maps.values())))
+    return df, maps
+
+
+def plot_eval(df, maps):
+    # ------------------------------------------------------------------
+    # 8. Plot time series and maps
+    # ------------------------------------------------------------------
+    ax = df.plot(
+        title='G6sulfur r1i1p1f2 – Global Mean (2020–2100)',
+        secondary_y='rsds' if 'rsds' in df else None,
+        figsize=(11, 5),
+        x_compat=True,   # matplotlib dates, so the gap spans line up
+    )
+    ax.left_axis.set_ylabel('Temperature (K)')
+    if 'rsds' in df:
+        ax.right_axis.set_ylabel('Shortwave (W m⁻²)')
+    # Missing months are NaN rows in the table – shade them, don't bridge them
+    for name, runs in df.attrs.get("gaps", {}).items():
+        for first, last, _ in runs:
+            ax.axvspan(pd.Timestamp(first),
+                       pd.Timestamp(last) + pd.offsets.MonthEnd(),
+                       color='gray', alpha=0.2, label=f'{name} gap')
     plt.show()
 
+    plot_map(maps['tas'], 'tas 2020–2029 (K)', 'RdYlBu_r', 230, 310)
+    if 'rsds' in maps:
+        plot_map(maps['rsds'], 'rsds 2020–2029 (W m⁻²)', 'YlOrRd', 100, 300)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--distributed", action="store_true",
+                        help="Run the reductions on a dask LocalCluster")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads-per-worker", type=int, default=2)
+    parser.add_argument("--memory-limit", default="4GB",
+                        help="Per-worker memory limit (e.g. 4GB)")
+    parser.add_argument("--time-chunk", type=int, default=120,
+                        help="Months per chunk (default: one decade)")
+    parser.add_argument("--space-chunk", type=int, default=-1,
+                        help="Cells per lat/lon chunk (-1: whole field)")
+    parser.add_argument("--members", nargs="+", default=["r1i1p1f2"])
+    parser.add_argument("--experiments", nargs="+", default=["G6sulfur"])
+    parser.add_argument("--report", type=Path,
+                        default=FIGURES_DIR / "data_eval_dask_report.html",
+                        help="Dask performance report (with task stream)")
+    args = parser.parse_args(argv)
+
+    chunks = {"time": args.time_chunk, "lat": args.space_chunk,
+              "lon": args.space_chunk}
+    ensemble = len(args.members) > 1 or len(args.experiments) > 1
+
+    # The cluster only lives for the computations – it is shut down before
+    # the (blocking) plt.show() calls
+    cluster, client = (start_cluster(args) if args.distributed
+                       else (None, None))
+    try:
+        with report_context(args):
+            if ensemble:
+                results = ensemble_eval(args, chunks)
+            else:
+                df, maps = evaluate(args, chunks)
+    finally:
+        stop_cluster(cluster, client)
+    if args.distributed and args.report:
+        print(f"Dask performance report: {args.report}")
+
+    if ensemble:
+        plot_ensemble(results)
+    else:
+        plot_eval(df, maps)
 
-plot_map(tas_dec, 'tas 2020–2029 (K)', 'RdYlBu_r', 230, 310)
 
-if ds_rsds:
-    rsds_dec = ds_rsds.rsds.sel(time=dec).mean('time')
-    plot_map(rsds_dec, 'rsds 2020–2029 (W m⁻²)', 'YlOrRd', 100, 300)
+if __name__ == "__main__":
+    main()
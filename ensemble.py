@@ -0,0 +1,96 @@
+# ensemble.py
+"""
+Ensemble-scale analysis across members and experiments.
+
+open_ensemble() lazily stacks the per-run Zarr stores along new
+`experiment` and `member` dims (runs that don't exist are NaN), and
+ensemble_stats() computes the ensemble mean, spread and percentiles in one
+chunked dask pass. Nothing per member is ever loaded: memory scales with the
+chunk size times the number of members in a chunk, not with the ensemble.
+
+    da = open_ensemble("tas", "Amon", ["r1i1p1f2", "r2i1p1f2"],
+                       ["G6sulfur", "G6solar", "ssp585", "ssp245"])
+    stats = ensemble_stats(global_mean(da))
+"""
+
+import dask
+import pandas as pd
+import xarray as xr
+
+import catalog
+from paths import DATA_DIR
+from zarr_store import open_store
+
+PERCENTILES = (5, 50, 95)
+
+
+def available(variable, table_id, data_dir=DATA_DIR):
+    """{experiment: [members]} present in the catalog for a variable."""
+    runs = {}
+    for var, table, member, experiment in catalog.datasets(data_dir):
+        if (var, table) == (variable, table_id):
+            runs.setdefault(experiment, []).append(member)
+    return runs
+
+
+def open_ensemble(variable, table_id, members=None, experiments=None,
+                  data_dir=DATA_DIR, chunks=None):
+    """
+    Lazily stack `variable` for every (experiment, member) into one
+    DataArray with dims (experiment, member, time, ...).
+
+    None for members/experiments means everything in the catalog.
+    """
+    runs = available(variable, table_id, data_dir)
+    experiments = list(experiments or sorted(runs))
+    members = list(members or sorted({m for ms in runs.values() for m in ms}))
+    if not any(m in runs.get(e, ()) for e in experiments for m in members):
+        raise FileNotFoundError(
+            f"No {variable}_{table_id} runs for {experiments} × {members}")
+
+    per_experiment = []
+    for experiment in experiments:
+        arrays, names = [], []
+        for member in members:
+            if member not in runs.get(experiment, ()):
+                continue
+            ds = open_store(variable, table_id, member, experiment,
+                            data_dir=data_dir, chunks=chunks)
+            arrays.append(ds[variable])
+            names.append(member)
+        if not arrays:
+            continue
+        stacked = xr.concat(arrays, dim=pd.Index(names, name="member"),
+                            join="outer", coords="minimal",
+                            compat="override")
+        per_experiment.append((experiment, stacked.reindex(member=members)))
+
+    da = xr.concat([a for _, a in per_experiment],
+                   dim=pd.Index([e for e, _ in per_experiment],
+                                name="experiment"),
+                   join="outer", coords="minimal", compat="override")
+    return da.reindex(experiment=experiments)
+
+
+def ensemble_stats(da, percentiles=PERCENTILES, dim="member"):
+    """
+    Ensemble mean, standard deviation and percentiles over `dim`, computed
+    together in one pass. Returns a Dataset with variables mean, std and
+    p05/p50/p95 (one per percentile).
+    """
+    # Percentiles need the whole ensemble in each chunk along `dim`
+    if da.chunks is not None:
+        da = da.chunk({dim: -1})
+
+    stats = {"mean": da.mean(dim), "std": da.std(dim)}
+    if percentiles:
+        q = da.quantile([p / 100 for p in percentiles], dim=dim)
+        for p in percentiles:
+            stats[f"p{p:02d}"] = q.sel(quantile=p / 100, drop=True)
+
+    names = list(stats)
+    computed = dask.compute(*stats.values())
+    out = xr.Dataset(dict(zip(names, computed)))
+    out.attrs = {k: v for k, v in da.attrs.items()
+                 if k in ("units", "long_name", "standard_name")}
+    return out
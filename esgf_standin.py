@@ -0,0 +1,239 @@
+# esgf_standin.py
+"""
+Local stand-in for an ESGF index node and data node.
+
+Record mode forwards every search to a real index node. It saves each
+response under CACHE_DIR/esgf_recordings, keyed by the normalized query
+string (parameters sorted). Replay mode serves only those recordings, with
+no network access. File results are rewritten so their HTTPServer URLs
+point back at this server. /files/<filename> serves bytes from a local
+tree, with HTTP Range support so the downloader's resume path can be
+exercised too. The server speaks plain HTTP; esgpull upgrades result URLs
+to https://, and data_download.standin_urls() turns them back for an
+http:// --index-node.
+
+Optional --latency and --bandwidth simulate a slow index or data node for
+load tests of data_download.py.
+
+Usage:
+    python esgf_standin.py --record --upstream https://esgf-node.llnl.gov/esg-search/search
+    python esgf_standin.py --files-root D:/school/MET6155/final_project/data
+    python data_download.py --index-node http://127.0.0.1:8765/esg-search/search --no-cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+
+from paths import CACHE_DIR, DATA_DIR
+
+RECORD_DIR = CACHE_DIR / "esgf_recordings"
+SEARCH_PATH = "/esg-search/search"
+BLOCK = 1 << 20
+
+# Query parameters that change between identical searches
+VOLATILE = ("_", "callback")
+
+
+def normalize_query(query):
+    params = sorted((k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+                    if k not in VOLATILE)
+    return urlencode(params)
+
+
+def recording_path(query, record_dir=RECORD_DIR):
+    key = hashlib.sha256(normalize_query(query).encode()).hexdigest()[:20]
+    return Path(record_dir) / f"{key}.json"
+
+
+def index_files(root):
+    """{filename: path} for every .nc file under root."""
+    found = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".nc"):
+                found.setdefault(name, Path(dirpath) / name)
+    return found
+
+
+def rewrite_urls(body, base):
+    """Point the HTTPServer URLs of File docs at this server."""
+    for doc in body.get("response", {}).get("docs", []):
+        urls = doc.get("url")
+        if not urls:
+            continue
+        out = []
+        for entry in urls:
+            parts = entry.split("|")
+            if len(parts) == 3 and parts[2] == "HTTPServer":
+                name = parts[0].rsplit("/", 1)[-1]
+                parts[0] = f"{base}/files/{quote(name)}"
+            out.append("|".join(parts))
+        doc["url"] = out
+    return body
+
+
+# ------------------------------------------------------------------
+# Handler
+# ------------------------------------------------------------------
+class StandInHandler(BaseHTTPRequestHandler):
+    server_version = "ESGFStandIn/1.0"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == SEARCH_PATH:
+            return self._search(url.query)
+        if url.path.startswith("/files/"):
+            return self._file(unquote(url.path[len("/files/"):]))
+        self._send_json(404, {"error": f"unknown path {url.path}"})
+
+    do_HEAD = do_GET
+
+    # -- search ----------------------------------------------------
+    def _search(self, query):
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        path = recording_path(query, srv.record_dir)
+
+        if srv.upstream and (srv.record_all or not path.exists()):
+            import httpx
+            resp = httpx.get(f"{srv.upstream}?{query}", timeout=120)
+            if resp.status_code != 200:
+                return self._send_json(resp.status_code, {"error": resp.text})
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as fh:
+                json.dump({"query": normalize_query(query),
+                           "body": resp.json()}, fh)
+
+        if not path.exists():
+            return self._send_json(404, {
+                "error": "no recording for this search",
+                "query": normalize_query(query)})
+        with open(path) as fh:
+            body = json.load(fh)["body"]
+        self._send_json(200, rewrite_urls(body, srv.base_url))
+
+    # -- files -----------------------------------------------------
+    def _file(self, name):
+        srv = self.server
+        path = srv.files.get(name)
+        if path is None:
+            return self._send_json(404, {"error": f"no file {name}"})
+        size = path.stat().st_size
+        start, status = 0, 200
+        rng = self.headers.get("Range", "")
+        if rng.startswith("bytes="):
+            first = rng[len("bytes="):].split("-", 1)[0]
+            start = int(first or 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/netcdf")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(size - start))
+        if status == 206:
+            self.send_header("Content-Range",
+                             f"bytes {start}-{size - 1}/{size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            while True:
+                t0 = time.perf_counter()
+                block = fh.read(BLOCK)
+                if not block:
+                    break
+                try:
+                    self.wfile.write(block)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                if srv.bandwidth:
+                    wait = len(block) / srv.bandwidth - (time.perf_counter() - t0)
+                    if wait > 0:
+                        time.sleep(wait)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, files_root=DATA_DIR, record_dir=RECORD_DIR,
+                 upstream=None, record_all=False, latency=0.0, bandwidth=0.0,
+                 verbose=False):
+        super().__init__(address, StandInHandler)
+        host, port = self.server_address[:2]
+        self.base_url = f"http://{host}:{port}"
+        self.files = index_files(files_root) if files_root else {}
+        self.record_dir = Path(record_dir)
+        self.upstream = upstream
+        self.record_all = record_all
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.verbose = verbose
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--files-root", type=Path, default=DATA_DIR,
+                        help="Tree of .nc files served under /files/")
+    parser.add_argument("--record-dir", type=Path, default=RECORD_DIR)
+    parser.add_argument("--upstream",
+                        help="Real index node search URL; searches without "
+                             "a recording are forwarded and recorded")
+    parser.add_argument("--record", action="store_true",
+                        help="With --upstream: re-record every search")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every search response")
+    parser.add_argument("--bandwidth", type=float, default=0.0,
+                        help="File transfer limit in MB/s per connection")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.record and not args.upstream:
+        parser.error("--record needs --upstream")
+
+    server = StandInServer((args.host, args.port), args.files_root,
+                           args.record_dir, args.upstream, args.record,
+                           args.latency, args.bandwidth * 1e6, args.verbose)
+    n = len(list(args.record_dir.glob("*.json"))) if args.record_dir.exists() else 0
+    print(f"ESGF stand-in on {server.base_url}{SEARCH_PATH}")
+    print(f"  {n} recorded search(es), {len(server.files)} file(s) "
+          f"under {args.files_root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
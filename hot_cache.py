@@ -0,0 +1,198 @@
+# hot_cache.py
+"""
+Uncompressed, memory-mapped cache of frequently used fields.
+
+A hot entry is one variable of one run stored in its native dtype as a
+plain .npy file, with two small sidecars:
+
+    meta.json   – dims, dtype, shape, source fingerprint, last access
+    coords.nc   – the coordinate variables (time decoded on open)
+
+open_hot() maps the .npy read-only and wraps it in a DataArray without
+copying, so only the pages a reduction touches are read and nothing is
+decompressed. The first touch copies the field out of its Zarr store one
+time chunk at a time. Entries are rebuilt when their source files change
+and evicted least-recently-used first to keep the cache under BUDGET bytes.
+
+Usage:
+    python hot_cache.py list
+    python hot_cache.py warm --variable tas --table Amon
+    python hot_cache.py evict --budget-gb 4
+"""
+
+import argparse
+import json
+import shutil
+import threading
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+import catalog
+from instrument import stage
+from paths import CACHE_DIR, DATA_DIR
+from stream_reduce import TIME_CHUNK
+from zarr_store import fingerprint, open_store
+
+HOT_DIR = CACHE_DIR / "hot"
+BUDGET = 10 * 1024 ** 3      # bytes
+
+# Prefetch threads may ask for the same entry at once; build it only once
+_build_lock = threading.Lock()
+
+
+def hot_path(variable, table_id, member, experiment, hot_dir=HOT_DIR):
+    return Path(hot_dir) / f"{variable}_{table_id}_{experiment}_{member}"
+
+
+def _read_meta(entry):
+    with open(entry / "meta.json") as fh:
+        return json.load(fh)
+
+
+def _write_meta(entry, meta):
+    tmp = entry / "meta.json.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh, indent=1,
+                  default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o))
+    tmp.replace(entry / "meta.json")
+
+
+def entries(hot_dir=HOT_DIR):
+    """[(path, meta)] of complete entries, least recently used first."""
+    found = []
+    for entry in Path(hot_dir).glob("*"):
+        if (entry / "meta.json").exists():
+            found.append((entry, _read_meta(entry)))
+    return sorted(found, key=lambda e: e[1]["accessed"])
+
+
+# ------------------------------------------------------------------
+# Eviction
+# ------------------------------------------------------------------
+def evict(budget=BUDGET, hot_dir=HOT_DIR):
+    """Drop least-recently-used entries until the total fits in budget."""
+    current = entries(hot_dir)
+    total = sum(meta["nbytes"] for _, meta in current)
+    removed = []
+    for entry, meta in current:
+        if total <= budget:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= meta["nbytes"]
+        removed.append(entry.name)
+    return removed
+
+
+# ------------------------------------------------------------------
+# Write / open
+# ------------------------------------------------------------------
+def put(da, entry, source_fingerprint, budget=BUDGET, time_chunk=TIME_CHUNK):
+    """Copy `da` into a hot entry chunk by chunk. False if over budget."""
+    da = da.transpose("time", ...)
+    nbytes = da.dtype.itemsize * int(np.prod(da.shape))
+    if nbytes > budget:
+        warnings.warn(f"{entry.name} is {nbytes / 1e9:.1f} GB – larger than "
+                      f"the {budget / 1e9:.1f} GB hot-cache budget, not cached")
+        return False
+
+    # The old copy of this entry (if any) goes first, then room is made
+    shutil.rmtree(entry, ignore_errors=True)
+    evict(budget - nbytes, entry.parent)
+    entry.mkdir(parents=True)
+
+    with stage("convert", what="hot cache", variable=da.name,
+               mb=round(nbytes / 1024 ** 2)):
+        mm = np.lib.format.open_memmap(entry / "data.npy", mode="w+",
+                                       dtype=da.dtype, shape=da.shape)
+        nt = da.sizes["time"]
+        for i in range(0, nt, time_chunk):
+            mm[i:i + time_chunk] = da.isel(time=slice(i, i + time_chunk)).values
+        mm.flush()
+        del mm
+
+    coords = xr.Dataset(coords={k: v.variable for k, v in da.coords.items()})
+    for var in coords.variables.values():
+        var.encoding = {k: v for k, v in var.encoding.items()
+                        if k in ("units", "calendar", "dtype")}
+    coords.to_netcdf(entry / "coords.nc")
+
+    _write_meta(entry, {"name": da.name, "dims": list(da.dims),
+                        "shape": list(da.shape), "dtype": str(da.dtype),
+                        "nbytes": nbytes, "attrs": dict(da.attrs),
+                        "source_fingerprint": source_fingerprint,
+                        "created": time.time(), "accessed": time.time()})
+    return True
+
+
+def load(entry):
+    """Zero-copy DataArray over the entry's memory-mapped data."""
+    meta = _read_meta(entry)
+    data = np.load(entry / "data.npy", mmap_mode="r")
+    with xr.open_dataset(entry / "coords.nc") as ds:
+        coords = ds.load().coords
+    meta["accessed"] = time.time()
+    _write_meta(entry, meta)
+    return xr.DataArray(data, dims=meta["dims"], coords=coords,
+                        name=meta["name"], attrs=meta["attrs"])
+
+
+def open_hot(variable, table_id, member="r1i1p1f2", experiment="G6sulfur",
+             data_dir=DATA_DIR, hot_dir=HOT_DIR, budget=BUDGET):
+    """
+    The variable as a memory-mapped DataArray, copied out of its Zarr store
+    on first use. Falls back to the (lazy) store when it won't fit.
+    """
+    entry = hot_path(variable, table_id, member, experiment, hot_dir)
+    fp = fingerprint(catalog.find(variable, table_id, member=member,
+                                  experiment=experiment, data_dir=data_dir))
+    with _build_lock:
+        if (entry / "meta.json").exists():
+            if _read_meta(entry)["source_fingerprint"] == fp:
+                return load(entry)
+            print(f"{entry.name} hot entry is stale – rebuilding")
+
+        ds = open_store(variable, table_id, member, experiment,
+                        data_dir=data_dir)
+        print(f"Copying {variable} into the hot cache...")
+        if not put(ds[variable], entry, fp, budget):
+            return ds[variable]
+        return load(entry)
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("list", "warm", "evict"))
+    parser.add_argument("--variable", default="tas")
+    parser.add_argument("--table", dest="table_id", default="Amon")
+    parser.add_argument("--member", default="r1i1p1f2")
+    parser.add_argument("--experiment", default="G6sulfur")
+    parser.add_argument("--budget-gb", type=float, default=BUDGET / 1024 ** 3)
+    args = parser.parse_args(argv)
+    budget = int(args.budget_gb * 1024 ** 3)
+
+    if args.command == "warm":
+        open_hot(args.variable, args.table_id, args.member, args.experiment,
+                 budget=budget)
+    elif args.command == "evict":
+        for name in evict(budget):
+            print(f"Evicted {name}")
+
+    total = 0
+    for entry, meta in entries():
+        total += meta["nbytes"]
+        age = (time.time() - meta["accessed"]) / 3600
+        print(f"{entry.name:40} {meta['nbytes'] / 1024 ** 2:9.0f} MB  "
+              f"used {age:6.1f} h ago")
+    print(f"{total / 1024 ** 3:.2f} of {args.budget_gb:.2f} GB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+# instrument.py
+"""
+Stage-level timing and profiling shared by every script.
+
+Wrap a pipeline stage – discovery, open, reduce, compute, render, savefig –
+in `with stage("reduce", variable="tas"):` (or use it as a decorator). On
+exit one JSON line is appended to the stage log with
+
+    wall_s, cpu_s        – elapsed and process CPU seconds
+    read_mb              – bytes read by this process during the stage
+    dask_tasks           – tasks run by local dask computes started from
+                           this stage's thread
+    rss_mb, peak_rss_mb  – resident memory now / process high-water mark
+
+plus the run id, script, parent stage and any keyword fields. Stages nest;
+an exception is recorded as "error" and re-raised.
+
+Environment:
+    MET6155_STAGE_LOG        log path (default CACHE_DIR/stages.jsonl,
+                             "off" disables logging)
+    MET6155_PROFILE          "cprofile" or "pyinstrument" – profile stages
+    MET6155_PROFILE_STAGES   comma-separated stage names to profile
+                             (default: all)
+
+cpu_s and read_mb are process-wide: stages running at the same time in other
+threads (prefetch loads) are included. dask_tasks is per stage – the local
+schedulers fire callbacks in the thread that called compute. Tasks run on a
+dask.distributed cluster are not counted. Render workers log their own
+savefig stages.
+
+Usage:
+    python instrument.py summary               # last run vs earlier runs
+    python instrument.py summary --script anomaly_figures.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from paths import CACHE_DIR
+
+STAGE_LOG = CACHE_DIR / "stages.jsonl"
+PROFILE_DIR = CACHE_DIR / "profiles"
+PROFILERS = ("cprofile", "pyinstrument")
+
+RUN_ID = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def log_path():
+    value = os.environ.get("MET6155_STAGE_LOG")
+    if value == "off":
+        return None
+    return Path(value) if value else STAGE_LOG
+
+
+# ------------------------------------------------------------------
+# Probes
+# ------------------------------------------------------------------
+def _bytes_read():
+    try:
+        with open("/proc/self/io") as fh:
+            for line in fh:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().io_counters().read_bytes
+    except (ImportError, AttributeError):
+        return None
+
+
+def _rss_mb():
+    """(current, peak) resident set size in MB; None where unavailable."""
+    current = peak = None
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        current = info.rss / 1024 ** 2
+        peak = getattr(info, "peak_wset", None)          # Windows
+        peak = peak / 1024 ** 2 if peak else None
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as fh:
+                current = (int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+                           / 1024 ** 2)
+        except (OSError, AttributeError, ValueError):
+            pass
+    if peak is None:
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+        except ImportError:
+            pass
+    return current, peak
+
+
+def _task_counter():
+    """A dask callback counting executed tasks, or None without dask."""
+    try:
+        from dask.callbacks import Callback
+    except ImportError:
+        return None
+
+    class TaskCounter(Callback):
+        def __init__(self):
+            super().__init__()
+            self.count = 0
+            # Callbacks are global; count only computes from this thread
+            self._thread = threading.get_ident()
+
+        def _pretask(self, key, dask, state):
+            if threading.get_ident() == self._thread:
+                self.count += 1
+
+    return TaskCounter()
+
+
+# ------------------------------------------------------------------
+# Profilers
+# ------------------------------------------------------------------
+def _profiler_for(name):
+    kind = os.environ.get("MET6155_PROFILE", "").lower()
+    if kind not in PROFILERS:
+        return None
+    only = os.environ.get("MET6155_PROFILE_STAGES")
+    if only and name not in {s.strip() for s in only.split(",")}:
+        return None
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("Warning: pyinstrument not installed – using cProfile")
+        else:
+            return kind, Profiler()
+    import cProfile
+    return "cprofile", cProfile.Profile()
+
+
+def _start(profiler):
+    kind, prof = profiler
+    prof.start() if kind == "pyinstrument" else prof.enable()
+
+
+def _stop(profiler, name):
+    kind, prof = profiler
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{RUN_ID}_{name}_{time.perf_counter_ns()}"
+    if kind == "pyinstrument":
+        prof.stop()
+        path = stem.with_suffix(".html")
+        path.write_text(prof.output_html(), encoding="utf-8")
+    else:
+        prof.disable()
+        path = stem.with_suffix(".prof")
+        prof.dump_stats(path)
+    return str(path)
+
+
+# ------------------------------------------------------------------
+# Stage
+# ------------------------------------------------------------------
+def _write(record):
+    path = log_path()
+    if path is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, default=str)
+    with _write_lock, open(path, "a", encoding="utf-8") as fh:
+        fh.write(line + "\n")
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time, measure and optionally profile the enclosed block as `name`."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+
+    counter = _task_counter()
+    # Only one profiler may be active – nested stages share the outer one
+    profiler = None if getattr(_local, "profiling", False) else _profiler_for(name)
+    read0 = _bytes_read()
+    record = {"run": RUN_ID, "script": Path(sys.argv[0]).name,
+              "stage": name, "parent": parent,
+              "start": time.strftime("%Y-%m-%dT%H:%M:%S"), **fields}
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    if counter is not None:
+        counter.register()
+    if profiler is not None:
+        _start(profiler)
+        _local.profiling = True
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        if profiler is not None:
+            record["profile"] = _stop(profiler, name)
+            _local.profiling = False
+        if counter is not None:
+            counter.unregister()
+        read1 = _bytes_read()
+        rss, peak = _rss_mb()
+        record.update(
+            wall_s=round(time.perf_counter() - wall0, 4),
+            cpu_s=round(time.process_time() - cpu0, 4),
+            read_mb=(round((read1 - read0) / 1024 ** 2, 2)
+                     if read0 is not None and read1 is not None else None),
+            dask_tasks=counter.count if counter is not None else None,
+            rss_mb=round(rss, 1) if rss is not None else None,
+            peak_rss_mb=round(peak, 1) if peak is not None else None,
+        )
+        stack.pop()
+        _write(record)
+
+
+# ------------------------------------------------------------------
+# Summary
+# ------------------------------------------------------------------
+def load(path=None):
+    path = Path(path) if path else log_path()
+    if path is None or not path.exists():
+        return []
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def summary(records, script=None):
+    """Per-stage wall time of the latest run vs the median of earlier runs."""
+    if script:
+        records = [r for r in records if r.get("script") == script]
+    if not records:
+        print("No stage records")
+        return
+    last = records[-1]["run"]
+    totals = {}
+    for r in records:
+        key = r["stage"]
+        runs = totals.setdefault(key, {})
+        runs[r["run"]] = runs.get(r["run"], 0.0) + r["wall_s"]
+
+    print(f"Run {last} ({records[-1]['script']})")
+    print(f"  {'stage':12} {'latest':>9} {'median':>9} {'runs':>5}")
+    for key, runs in totals.items():
+        if last not in runs:
+            continue
+        earlier = sorted(v for run, v in runs.items() if run != last)
+        median = earlier[len(earlier) // 2] if earlier else None
+        flag = ""
+        if median and runs[last] > 1.2 * median:
+            flag = "  ← slower"
+        print(f"  {key:12} {runs[last]:8.2f}s "
+              f"{(f'{median:8.2f}s' if median is not None else '       –')} "
+              f"{len(runs):5d}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("summary",))
+    parser.add_argument("--log", type=Path, default=None)
+    parser.add_argument("--script", help="Only runs of this script")
+    args = parser.parse_args(argv)
+    summary(load(args.log), args.script)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
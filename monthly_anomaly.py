@@ -0,0 +1,159 @@
+# monthly_anomaly.py
+"""
+Out-of-core monthly anomalies relative to a calendar-month climatology.
+
+Pass 1 computes the 12-month climatology of the full record with the
+streaming reducer (cached like every other reduction). Pass 2 streams the
+Zarr store again one time chunk at a time, subtracts the matching calendar
+month and writes the gridded anomalies – plus their area-weighted global
+mean – into a chunked store under CACHE_DIR/anomalies with region writes.
+Memory stays at one time chunk however long or fine the record is.
+
+The store is written at float32 + zstd by default; --precision selects
+float16 and/or bit-rounding (see product_writer.py), and the achieved
+compression ratio and error bounds are stored in its attrs.
+
+Usage:
+    python monthly_anomaly.py                       # tas, tos and rsds
+    python monthly_anomaly.py --variable tos --table Omon
+    python monthly_anomaly.py --precision compact       # float32, 12 bits
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+import catalog
+import product_writer
+from instrument import stage
+from paths import CACHE_DIR, DATA_DIR
+from reduce_cache import reduce_stream
+from spatial_mean import global_mean
+from stream_reduce import TIME_CHUNK
+from zarr_store import chunks_for, fingerprint, open_store
+
+ANOMALY_DIR = CACHE_DIR / "anomalies"
+
+VARIABLES = (("tas", "Amon"), ("tos", "Omon"), ("rsds", "Amon"))
+
+
+def anomaly_path(variable, table_id, member, experiment,
+                 anomaly_dir=ANOMALY_DIR):
+    return (Path(anomaly_dir)
+            / f"{variable}_{table_id}_{experiment}_{member}_anom.zarr")
+
+
+# ------------------------------------------------------------------
+# Build
+# ------------------------------------------------------------------
+def build(variable, table_id, member="r1i1p1f2", experiment="G6sulfur",
+          data_dir=DATA_DIR, anomaly_dir=ANOMALY_DIR, time_chunk=TIME_CHUNK,
+          precision=product_writer.DEFAULT):
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+
+    # Pass 1 – climatology (one streaming pass, cached)
+    print(f"{variable}: monthly climatology...")
+    clim = reduce_stream(variable, table_id, groupings=("monthly_clim",),
+                         member=member, experiment=experiment,
+                         data_dir=data_dir).monthly_clim
+    clim = clim.reindex(month=np.arange(1, 13)).values.astype(np.float32)
+
+    ds = open_store(variable, table_id, member, experiment, data_dir=data_dir)
+    da = ds[variable].transpose("time", ...)
+    name, gm_name = f"{variable}_anom", f"{variable}_anom_gm"
+
+    # Metadata-only template; the data is filled chunk by chunk below
+    template = xr.Dataset({
+        name: da.astype(np.float32),
+        gm_name: global_mean(da, table_id).astype(np.float32),
+    })
+    for var in template.variables.values():
+        var.encoding = {}
+    template.attrs = {"source_fingerprint": fingerprint(entries),
+                      "climatology": "calendar-month mean of full record"}
+    template[name].attrs = dict(da.attrs)
+    encoding = product_writer.encoding_for(template, precision, chunks={
+        name: tuple(chunks_for(da).values()),
+        gm_name: (min(time_chunk, da.sizes["time"]),)})
+
+    path = anomaly_path(variable, table_id, member, experiment, anomaly_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    template.to_zarr(path, mode="w", compute=False, encoding=encoding,
+                     consolidated=True)
+
+    # Pass 2 – subtract the climatology and write each time chunk in place
+    months = da.time.dt.month.values - 1
+    nt = da.sizes["time"]
+    print(f"{variable}: writing anomalies ({nt} months)...")
+    errors = {name: (0.0, 0.0), gm_name: (0.0, 0.0)}
+    with stage("compute", what="monthly anomalies", variable=variable):
+        for i in range(0, nt, time_chunk):
+            sl = slice(i, min(i + time_chunk, nt))
+            block = da.isel(time=sl).load()
+            anom = block - clim[months[sl]]
+            out = xr.Dataset({name: anom, gm_name: global_mean(anom, table_id)})
+            for var in (name, gm_name):
+                out[var], err = product_writer.quantize(out[var], precision)
+                errors[var] = tuple(max(a, b) for a, b in zip(errors[var], err))
+            out = out.drop_vars([c for c in out.coords
+                                 if "time" not in out[c].dims])
+            out.to_zarr(path, region={"time": sl})
+
+    rep = product_writer.report(path, template, errors, precision)
+    product_writer.set_report(path, rep)
+    product_writer.print_report(path, rep)
+    return path
+
+
+# ------------------------------------------------------------------
+# Open
+# ------------------------------------------------------------------
+def open_anomalies(variable, table_id, member="r1i1p1f2",
+                   experiment="G6sulfur", data_dir=DATA_DIR,
+                   anomaly_dir=ANOMALY_DIR):
+    """Open the anomaly store, (re)building it if missing or stale."""
+    path = anomaly_path(variable, table_id, member, experiment, anomaly_dir)
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+    if path.exists():
+        ds = xr.open_zarr(path, consolidated=True)
+        if ds.attrs.get("source_fingerprint") == fingerprint(entries):
+            return ds
+        ds.close()
+        print(f"{path.name} is stale – rebuilding")
+    build(variable, table_id, member, experiment, data_dir, anomaly_dir)
+    return xr.open_zarr(path, consolidated=True)
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variable")
+    parser.add_argument("--table", dest="table_id")
+    parser.add_argument("--member", default="r1i1p1f2")
+    parser.add_argument("--experiment", default="G6sulfur")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--precision", type=product_writer.parse_precision,
+                        default=product_writer.DEFAULT,
+                        help=f"{' | '.join(product_writer.PRESETS)} or "
+                             f"dtype[:keepbits[:compressor]]")
+    args = parser.parse_args(argv)
+
+    if args.variable:
+        todo = [(args.variable,
+                 args.table_id or dict(VARIABLES).get(args.variable, "Amon"))]
+    else:
+        todo = VARIABLES
+    for variable, table_id in todo:
+        build(variable, table_id, args.member, args.experiment, args.data_dir,
+              precision=args.precision)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,17 @@
+# paths.py
+"""
+Shared filesystem locations for the download, analysis and plotting scripts.
+
+Change BASE once here instead of in every script.
+"""
+
+from pathlib import Path
+
+# ------------------------------------------------------------------
+# BASE PATH – CHANGE ONLY THIS
+# ------------------------------------------------------------------
+BASE = r"D:\school\MET6155\final_project"
+
+DATA_DIR = Path(BASE) / "data"
+FIGURES_DIR = Path(BASE) / "figures"
+CACHE_DIR = Path(BASE) / "cache"
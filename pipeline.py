@@ -0,0 +1,128 @@
+# pipeline.py
+"""
+Single entry point for the G6sulfur pipeline.
+
+Each subcommand imports only the module that does the work, so light
+commands (catalog list, download --dry-run) start without paying for
+xarray, dask, matplotlib or cartopy. Arguments after the subcommand are
+passed through to that module's own CLI.
+
+    download    data_download.py   search ESGF and fetch/verify files
+    catalog     catalog.py         scan | list the local file index
+    reduce      reduce_cache.py    warm the cached streaming reductions
+    plot NAME   anomalies | tos | trend | suitability | sargassum
+    eval        data_eval.py       global-mean series and 2020s maps
+    build       build.py           rebuild only what changed (incremental)
+
+Usage:
+    python pipeline.py catalog list --variable tas
+    python pipeline.py download --dry-run
+    python pipeline.py reduce --variables tas tos
+    python pipeline.py plot anomalies --processes 4
+    python pipeline.py eval --distributed
+    python pipeline.py build --dry-run
+"""
+
+import argparse
+import importlib
+import sys
+
+# name → (module, passes argv to main)
+COMMANDS = {
+    "download": ("data_download", True),
+    "catalog": ("catalog", True),
+    "eval": ("data_eval", True),
+    "build": ("build", True),
+}
+
+PLOTS = {
+    "anomalies": ("anomaly_figures", True),
+    "tos": ("plt_tos_temp", False),
+    "trend": ("trend", True),
+    "suitability": ("suitability", True),
+    "sargassum": ("plt_figures", False),
+}
+
+# Same defaults as monthly_anomaly.VARIABLES, kept here so --help is instant
+REDUCE_VARIABLES = {"tas": "Amon", "tos": "Omon", "rsds": "Amon"}
+
+# The grouping sets the scripts read – anomaly_figures, monthly_anomaly,
+# trend, and plt_tos_temp for tos. None means the --baseline period; the
+# others are keyed on the default. reduce() merges sets sharing a baseline
+# into one pass; reduce_stream serves the subsets from that store.
+DEFAULT_BASELINE = (2020, 2029)
+REDUCTIONS = ((("decadal", "baseline"), None),
+              (("monthly_clim",), DEFAULT_BASELINE),
+              (("annual",), DEFAULT_BASELINE))
+TOS_REDUCTION = (("annual", "decadal", "baseline"), DEFAULT_BASELINE)
+
+
+def _run(target, argv):
+    module, takes_argv = target
+    main = importlib.import_module(module).main
+    if takes_argv:
+        return main(argv)
+    if argv:
+        raise SystemExit(f"{module}.py takes no arguments (got {argv})")
+    return main()
+
+
+def reduce(argv):
+    parser = argparse.ArgumentParser(
+        prog="pipeline.py reduce",
+        description="Build the cached reductions the figure, anomaly and "
+                    "trend scripts read (one streaming pass per grouping set)")
+    parser.add_argument("--variables", nargs="+", choices=list(REDUCE_VARIABLES),
+                        default=list(REDUCE_VARIABLES))
+    parser.add_argument("--member", default="r1i1p1f2")
+    parser.add_argument("--experiment", default="G6sulfur")
+    parser.add_argument("--baseline", nargs=2, type=int, default=(2020, 2029),
+                        metavar=("START", "END"),
+                        help="Baseline of the decadal anomaly figures")
+    args = parser.parse_args(argv)
+
+    from reduce_cache import reduce_stream
+
+    for variable in args.variables:
+        reductions = list(REDUCTIONS)
+        if variable == "tos":
+            reductions.append(TOS_REDUCTION)
+        # One streaming pass per baseline, with the union of its groupings
+        passes = {}
+        for groupings, baseline in reductions:
+            passes.setdefault(tuple(baseline or args.baseline),
+                              set()).update(groupings)
+        for baseline, groupings in passes.items():
+            print(f"Reducing {variable} ({'+'.join(sorted(groupings))})...")
+            reduce_stream(variable, REDUCE_VARIABLES[variable],
+                          groupings=sorted(groupings), baseline=baseline,
+                          member=args.member, experiment=args.experiment)
+    return 0
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[8:14]))
+    parser.add_argument("command", choices=[*COMMANDS, "reduce", "plot"])
+    parser.add_argument("args", nargs=argparse.REMAINDER,
+                        help="Passed to the subcommand (try <command> --help)")
+    if not argv or argv[0] in ("-h", "--help"):
+        parser.print_help()
+        return 0 if argv else 1
+    args = parser.parse_args(argv[:1])
+    rest = argv[1:]
+
+    if args.command == "reduce":
+        return reduce(rest)
+    if args.command == "plot":
+        if not rest or rest[0] not in PLOTS:
+            parser.error(f"plot needs one of {', '.join(PLOTS)}")
+        return _run(PLOTS[rest[0]], rest[1:])
+    return _run(COMMANDS[args.command], rest)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
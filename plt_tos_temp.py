@@ -1,56 +1,21 @@
 # plt_tos_anomaly_maps.py
-import xarray as xr
 import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
 import numpy as np
-import glob
 import os
-from pathlib import Path
+from functools import partial
+
+import catalog
+from instrument import stage
+from paths import DATA_DIR, FIGURES_DIR
+from prefetch import prefetch
+from reduce_cache import reduce_period, reduce_stream
+from regrid import regrid
+from render import MapJob, render_jobs
+from spatial_mean import global_mean
+from zarr_store import open_store
 
 # ------------------------------------------------------------------
-# 1. Paths
-# ------------------------------------------------------------------
-DATA_DIR = r"D:\school\MET6155\final_project\data"
-FIGURES_DIR = Path(DATA_DIR).parent / "figures"
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-
-print(f"Figures will be saved to: {FIGURES_DIR}\n")
-
-# ------------------------------------------------------------------
-# 2. Find tos files
-# ------------------------------------------------------------------
-tos_files = sorted(glob.glob(os.path.join(
-    DATA_DIR, "**", "tos_Omon_*.nc"), recursive=True))
-print(f"Found {len(tos_files)} tos files:")
-for f in tos_files:
-    print(f"  → {os.path.basename(f)}")
-
-if not tos_files:
-    raise FileNotFoundError("No tos files found!")
-
-# ------------------------------------------------------------------
-# 3. Open with CORRECT combine='nested' + concat_dim='time'
-# ------------------------------------------------------------------
-print("\nOpening all tos files with xarray...")
-ds = xr.open_mfdataset(
-    tos_files,
-    combine='nested',          # ← FIX: was 'by_coords'
-    concat_dim='time',         # ← Explicitly concatenate along time
-    compat='override',
-    coords='minimal',
-    data_vars='minimal'
-)
-
-# Ensure time is sorted
-ds = ds.sortby('time')
-
-# Decode time properly (cftime → pandas)
-ds = xr.decode_cf(ds)
-
-print(f"Time range: {ds.time.min().values} → {ds.time.max().values}")
-
-# ------------------------------------------------------------------
-# 4. Define decades
+# Decades
 # ------------------------------------------------------------------
 decades = [
     ("2020", "2029"),
@@ -63,74 +28,112 @@ decades = [
     ("2090", "2099"),
 ]
 
-# ------------------------------------------------------------------
-# 5. Baseline: 2020–2029
-# ------------------------------------------------------------------
-print("\nComputing baseline (2020–2029)...")
-baseline = ds.tos.sel(time=slice("2020-01-01", "2029-12-31")).mean(dim='time')
-print(f"Global mean baseline SST: {baseline.mean().values:.2f} K")
-
-# ------------------------------------------------------------------
-# 6. Process each decade
-# ------------------------------------------------------------------
-for start, end in decades:
-    print(f"\nProcessing {start}–{end}...")
-    decade_slice = ds.tos.sel(time=slice(f"{start}-01-01", f"{end}-12-31"))
 
-    if decade_slice.size == 0:
-        print(f"  → No data for {start}–{end}, skipping.")
-        continue
-
-    tos_mean = decade_slice.mean(dim='time')
-    tos_anom = tos_mean - baseline
+def main():
+    # ------------------------------------------------------------------
+    # 1. Paths
+    # ------------------------------------------------------------------
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+
+    print(f"Figures will be saved to: {FIGURES_DIR}\n")
+
+    # ------------------------------------------------------------------
+    # 2. Look up tos files in the catalog
+    # ------------------------------------------------------------------
+    with stage("discovery", what="catalog lookup"):
+        tos_files = catalog.paths(catalog.find(
+            "tos", "Omon", member="r1i1p1f2", experiment="G6sulfur",
+            data_dir=DATA_DIR))
+    print(f"Found {len(tos_files)} tos files:")
+    for f in tos_files:
+        print(f"  → {os.path.basename(f)}")
+
+    if not tos_files:
+        raise FileNotFoundError("No tos files found!")
+
+    # ------------------------------------------------------------------
+    # 3. Open the consolidated Zarr store (sorted, decoded time)
+    # ------------------------------------------------------------------
+    print("\nOpening tos store...")
+    ds = open_store("tos", "Omon", "r1i1p1f2", "G6sulfur", data_dir=DATA_DIR)
+
+    print(f"Time range: {ds.time.min().values} → {ds.time.max().values}")
+
+    # ------------------------------------------------------------------
+    # 4. One streaming pass: baseline (2020–2029), annual and decadal means
+    # ------------------------------------------------------------------
+    print("\nReducing tos (baseline, annual, decadal) in one pass...")
+    products = reduce_stream("tos", "Omon", groupings=("annual", "decadal",
+                                                       "baseline"),
+                             baseline=(2020, 2029))
+    baseline = products.baseline
+    print(f"Global mean baseline SST: "
+          f"{global_mean(baseline, 'Omon').values:.2f} K")
+
+    # ------------------------------------------------------------------
+    # 5. Each decade → SST anomaly job, plus SST minus tas on the tas grid
+    # ------------------------------------------------------------------
+    tas_base = reduce_period("tas", "Amon", (2020, 2029))
+
+    # The next decades' tas means are read while this one is regridded
+    available = []
+    for start, end in decades:
+        if int(start) in products.decade:
+            available.append((start, end))
+        else:
+            print(f"  → No data for {start}–{end}, skipping.")
+    tas_means = prefetch(((start, end), partial(reduce_period, "tas", "Amon",
+                                                (start, end)))
+                         for start, end in available)
+
+    jobs = []
+    for (start, end), tas_mean in tas_means:
+        print(f"\nProcessing {start}–{end}...")
+
+        tos_anom = products.decadal.sel(decade=int(start)) - baseline
+        jobs.append(MapJob(
+            field=tos_anom, levels=np.linspace(-2.5, 0.5, 21), cmap='RdBu_r',
+            title=f"G6sulfur SST Anomaly – {start}–{end}",
+            out_path=FIGURES_DIR / f"tos_anomaly_{start}.png",
+            cbar_label='ΔSST vs 2020–2029 (K)',
+        ))
+
+        # Weights are computed on the first call and reused from disk after
+        tos_on_tas = regrid(tos_anom, tas_base, method="bilinear")
+        tas_anom = tas_mean - tas_base
+        jobs.append(MapJob(
+            field=tos_on_tas - tas_anom, levels=np.linspace(-2, 2, 21),
+            cmap='PuOr_r',
+            title=f"G6sulfur ΔSST − Δtas – {start}–{end}",
+            out_path=FIGURES_DIR / f"tos_minus_tas_{start}.png",
+            cbar_label='ΔSST − ΔT vs 2020–2029 (K)',
+        ))
+
+    print(f"\nRendering {len(jobs)} map(s)...")
+    render_jobs(jobs)
+
+    # ------------------------------------------------------------------
+    # 6. Global mean trend
+    # ------------------------------------------------------------------
+    print("\nComputing global SST trend...")
+
+    # Decadal means from the same streaming pass
+    anoms = global_mean(products.decadal - baseline, "Omon")
 
     # Plot
-    fig, ax = plt.subplots(figsize=(12, 6), subplot_kw={
-                           'projection': ccrs.PlateCarree()})
-    levels = np.linspace(-2.5, 0.5, 21)
-    im = tos_anom.plot.contourf(
-        ax=ax,
-        transform=ccrs.PlateCarree(),
-        levels=levels,
-        cmap='RdBu_r',
-        extend='both',
-        cbar_kwargs={'label': 'ΔSST vs 2020–2029 (K)', 'shrink': 0.7}
-    )
-    ax.coastlines()
-    ax.set_title(f"G6sulfur SST Anomaly – {start}–{end}", fontsize=14)
-    ax.gridlines(draw_labels=True, alpha=0.4, linestyle='--')
-
-    # Save
-    out_path = FIGURES_DIR / f"tos_anomaly_{start}.png"
-    plt.savefig(out_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
-    print(f"   Saved: {out_path.name}")
-
-# ------------------------------------------------------------------
-# 7. Global mean trend
-# ------------------------------------------------------------------
-print("\nComputing global SST trend...")
-
-
-def global_mean(da):
-    weights = np.cos(np.deg2rad(da.lat))
-    return da.weighted(weights).mean(['lat', 'lon'])
-
-
-# Annual → decadal means
-annual = ds.tos.resample(time='YS').mean()
-decadal = annual.resample(time='10YS').mean()
-anoms = global_mean(decadal - baseline)
-
-# Plot
-plt.figure(figsize=(10, 4))
-anoms.plot(marker='o', color='teal')
-plt.axhline(0, color='k', linewidth=0.8)
-plt.title('G6sulfur Global-Mean SST Anomaly (vs 2020–2029)')
-plt.ylabel('ΔSST (K)')
-plt.grid(alpha=0.3)
-plt.tight_layout()
-plt.savefig(FIGURES_DIR / "tos_global_trend.png", dpi=150)
-plt.show()
-
-print(f"\nAll done! Figures saved in: {FIGURES_DIR}")
+    plt.figure(figsize=(10, 4))
+    anoms.plot(marker='o', color='teal')
+    plt.axhline(0, color='k', linewidth=0.8)
+    plt.title('G6sulfur Global-Mean SST Anomaly (vs 2020–2029)')
+    plt.ylabel('ΔSST (K)')
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    with stage("savefig", output="tos_global_trend.png"):
+        plt.savefig(FIGURES_DIR / "tos_global_trend.png", dpi=150)
+    plt.show()
+
+    print(f"\nAll done! Figures saved in: {FIGURES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
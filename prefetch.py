@@ -0,0 +1,54 @@
+# prefetch.py
+"""
+Bounded read-ahead for per-period loops.
+
+prefetch() runs the loads of the next `depth` items in background threads
+while the caller reduces or renders the current one, and yields results in
+the original order. At most `depth` results are loaded ahead of the
+consumer, which caps memory at roughly depth + 1 fields. Disk reads (and
+Zarr decompression, which releases the GIL) then overlap with the caller's
+CPU work without building a dask graph.
+
+    for (start, end), field in prefetch(
+            ((p, partial(load, p)) for p in periods), depth=2):
+        ...
+
+An exception raised by a load is re-raised when its item is reached.
+Leaving the loop early cancels the loads that have not started yet.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEPTH = 2
+
+
+def prefetch(tasks, depth=DEPTH, workers=None):
+    """Yield (key, load()) for each (key, load) in `tasks`, loading ahead."""
+    if depth < 1:
+        for key, load in tasks:
+            yield key, load()
+        return
+
+    tasks = iter(tasks)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers or depth,
+                            thread_name_prefix="prefetch") as pool:
+
+        def fill():
+            while len(pending) < depth:
+                try:
+                    key, load = next(tasks)
+                except StopIteration:
+                    return
+                pending.append((key, pool.submit(load)))
+
+        fill()
+        try:
+            while pending:
+                key, future = pending.popleft()
+                fill()
+                yield key, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,217 @@
+# product_writer.py
+"""
+Reduced-precision, compressed writer for derived products.
+
+Decadal means, climatologies and anomalies come out of the reducers as
+float64. Here they are written instead as
+
+    dtype       float32 (default) or float16
+    keepbits    optional bit-rounding to this many mantissa bits
+                (round-half-to-even on the IEEE bits, NaN preserved)
+    compressor  "zstd", "blosc" (zstd + bitshuffle) or "none"
+
+as consolidated Zarr. Bit-rounding zeroes the trailing mantissa bits so the
+compressor can squeeze them out; the relative error is bounded by
+2^-(keepbits+1). write() measures the real maximum absolute and relative
+error and the compression ratio against float64, prints them and stores
+them in the product's attrs under "precision".
+
+Usage:
+    python product_writer.py path/to/product.zarr        # show its report
+"""
+
+import argparse
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from zarr_store import compression
+
+Precision = namedtuple("Precision", "dtype keepbits compressor level",
+                       defaults=("float32", None, "zstd", 5))
+
+DEFAULT = Precision()
+COMPRESSORS = ("zstd", "blosc", "none")
+
+# Named settings for the --precision flags of the scripts
+PRESETS = {
+    "float32": Precision("float32"),
+    "compact": Precision("float32", keepbits=12),
+    "float16": Precision("float16", keepbits=None, compressor="blosc"),
+}
+
+
+def compressor_for(precision):
+    """Encoding entry for the precision's compressor (zarr 2 or zarr 3)."""
+    if precision.compressor not in COMPRESSORS:
+        raise ValueError(f"Unknown compressor '{precision.compressor}' – use "
+                         f"{COMPRESSORS}")
+    return compression(precision.compressor, precision.level)
+
+
+# ------------------------------------------------------------------
+# Quantize
+# ------------------------------------------------------------------
+def bitround(values, keepbits, dtype=np.float32):
+    """Round `values` (cast to dtype) to `keepbits` mantissa bits."""
+    dtype = np.dtype(dtype)
+    a = np.asarray(values).astype(dtype)
+    nmant = np.finfo(dtype).nmant
+    if keepbits is None or keepbits >= nmant:
+        return a
+    if keepbits < 0:
+        raise ValueError("keepbits must be ≥ 0")
+    uint = np.dtype(f"uint{dtype.itemsize * 8}").type
+    drop = nmant - keepbits
+    bits = a.view(uint)
+    half = uint((1 << (drop - 1)) - 1)
+    odd = (bits >> uint(drop)) & uint(1)
+    rounded = ((bits + half + odd) & uint(~((1 << drop) - 1) & np.iinfo(uint).max))
+    out = rounded.view(dtype)
+    return np.where(np.isnan(a), a, out)
+
+
+def _errors(original, stored):
+    """(max abs error, max relative error) of stored vs original."""
+    x = np.asarray(original, dtype=np.float64)
+    diff = np.abs(np.asarray(stored, dtype=np.float64) - x)
+    valid = np.isfinite(x)
+    if not valid.any():
+        return 0.0, 0.0
+    abs_err = float(diff[valid].max())
+    nz = valid & (x != 0)
+    rel_err = float((diff[nz] / np.abs(x[nz])).max()) if nz.any() else 0.0
+    return abs_err, rel_err
+
+
+def quantize(da, precision=DEFAULT):
+    """
+    (cast/rounded DataArray, (max_abs_err, max_rel_err)) for one variable.
+    Non-float variables are returned unchanged.
+    """
+    if not np.issubdtype(da.dtype, np.floating):
+        return da, (0.0, 0.0)
+    dtype = np.dtype(precision.dtype)
+    values = np.asarray(da.values)
+    finite = values[np.isfinite(values)]
+    if finite.size and np.abs(finite).max() > np.finfo(dtype).max:
+        raise ValueError(f"{da.name} exceeds the {dtype} range – use float32")
+    stored = bitround(values, precision.keepbits, dtype)
+    return da.copy(data=stored), _errors(values, stored)
+
+
+def encoding_for(ds, precision=DEFAULT, chunks=None):
+    """Zarr encoding for every float data variable of `ds`."""
+    compressor = compressor_for(precision)      # {"compressor(s)": ...}
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        if not np.issubdtype(var.dtype, np.floating):
+            continue
+        enc = {"dtype": precision.dtype, **compressor}
+        if chunks and name in chunks:
+            enc["chunks"] = chunks[name]
+        encoding[name] = enc
+    return encoding
+
+
+# ------------------------------------------------------------------
+# Report
+# ------------------------------------------------------------------
+def stored_bytes(path, name):
+    total = 0
+    for root, _, files in os.walk(Path(path) / name):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files
+                     if not f.startswith(".z") and f != "zarr.json")
+    return total
+
+
+def report(path, ds, errors, precision=DEFAULT):
+    """{variable: {dtype, keepbits, ratio, max_abs_err, max_rel_err}}."""
+    out = {}
+    for name, (abs_err, rel_err) in errors.items():
+        raw = ds[name].size * 8            # float64 in memory
+        disk = stored_bytes(path, name)
+        out[name] = {"dtype": precision.dtype, "keepbits": precision.keepbits,
+                     "compressor": precision.compressor,
+                     "ratio": round(raw / disk, 2) if disk else None,
+                     "max_abs_err": abs_err, "max_rel_err": rel_err}
+    return out
+
+
+def print_report(path, rep):
+    print(f"   Saved: {Path(path).name}")
+    for name, r in rep.items():
+        bits = f", {r['keepbits']} bits" if r["keepbits"] is not None else ""
+        print(f"     {name}: {r['dtype']}{bits} {r['compressor']} – "
+              f"{r['ratio']}x vs float64, max |err| {r['max_abs_err']:.3g} "
+              f"(rel {r['max_rel_err']:.2g})")
+
+
+def write(ds, path, precision=DEFAULT, chunks=None, verbose=True):
+    """Quantize and write `ds` to `path` (Zarr); returns the report."""
+    path = Path(path)
+    errors, out = {}, ds.copy()
+    for name in ds.data_vars:
+        out[name], err = quantize(ds[name], precision)
+        if np.issubdtype(ds[name].dtype, np.floating):
+            errors[name] = err
+    for var in out.variables.values():
+        var.encoding = {}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out.to_zarr(path, mode="w", consolidated=True,
+                encoding=encoding_for(out, precision, chunks))
+    rep = report(path, ds, errors, precision)
+    set_report(path, rep)
+    if verbose:
+        print_report(path, rep)
+    return rep
+
+
+def set_report(path, rep):
+    """Store the report in the store's attrs (and consolidated metadata)."""
+    import zarr
+
+    group = zarr.open_group(str(path), mode="r+")
+    group.attrs["precision"] = json.dumps(rep)
+    zarr.consolidate_metadata(str(path))
+
+
+def read_report(ds):
+    return json.loads(ds.attrs.get("precision", "{}"))
+
+
+def parse_precision(text):
+    """A preset name, or dtype[:keepbits[:compressor]] e.g. float32:10:blosc."""
+    if text in PRESETS:
+        return PRESETS[text]
+    parts = text.split(":")
+    dtype = parts[0]
+    keepbits = int(parts[1]) if len(parts) > 1 and parts[1] else None
+    compressor = parts[2] if len(parts) > 2 else DEFAULT.compressor
+    if dtype not in ("float32", "float16") or compressor not in COMPRESSORS:
+        raise argparse.ArgumentTypeError(
+            f"Bad precision '{text}' – use {list(PRESETS)} or "
+            f"float32|float16[:keepbits[:{'|'.join(COMPRESSORS)}]]")
+    return Precision(dtype, keepbits, compressor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args(argv)
+    ds = xr.open_zarr(args.path, consolidated=True)
+    rep = read_report(ds)
+    if not rep:
+        print("No precision report in this store")
+        return 1
+    print_report(args.path, rep)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+# reduce_cache.py
+"""
+On-disk cache of time reductions (decadal means, baseline climatologies, ...).
+
+Each (variable, member, experiment, period, statistic) result is stored as a
+small Zarr store under CACHE_DIR/reductions, written at float32 (or the
+requested precision, see product_writer.py). The cache key includes the
+fingerprint of the source files from the catalog, so a re-downloaded or added
+file invalidates exactly the reductions built from it. Re-running a plotting
+script after changing levels or colormaps only re-renders.
+"""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import xarray as xr
+
+import catalog
+import product_writer
+from instrument import stage
+from paths import CACHE_DIR, DATA_DIR
+from stream_reduce import stream_reduce
+from zarr_store import fingerprint, open_store
+
+REDUCTION_DIR = CACHE_DIR / "reductions"
+
+PRECISION = product_writer.DEFAULT
+
+STATISTICS = ("mean", "std", "min", "max")
+
+
+def cache_key(variable, table_id, member, experiment, period, statistic,
+              source_fingerprint, precision=PRECISION):
+    payload = json.dumps([variable, table_id, member, experiment,
+                          list(period), statistic, source_fingerprint,
+                          list(precision)])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _save(ds, path, prefix, precision):
+    # Drop results built from older inputs before writing the new one
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob(f"{prefix}_*"):
+        _remove(old)
+    product_writer.write(ds, path, precision, verbose=False)
+
+
+def _source(variable, table_id, member, experiment, data_dir, hot):
+    """The raw field: memory-mapped from the hot cache or lazy from Zarr."""
+    if hot:
+        from hot_cache import open_hot
+        return open_hot(variable, table_id, member, experiment,
+                        data_dir=data_dir)
+    ds = open_store(variable, table_id, member, experiment, data_dir=data_dir)
+    return ds[variable]
+
+
+def reduce_period(variable, table_id, period, statistic="mean",
+                  member="r1i1p1f2", experiment="G6sulfur",
+                  data_dir=DATA_DIR, cache_dir=REDUCTION_DIR, hot=False,
+                  precision=PRECISION):
+    """
+    Time `statistic` of `variable` over `period` = (start_year, end_year),
+    read from the cache when the source files are unchanged. With hot=True
+    a cache miss reads the field from the hot cache (see hot_cache.py).
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic '{statistic}' – use {STATISTICS}")
+    start, end = (str(p) for p in period)
+
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+    key = cache_key(variable, table_id, member, experiment, (start, end),
+                    statistic, fingerprint(entries), precision)
+    prefix = f"{variable}_{table_id}_{experiment}_{member}_{start}-{end}_{statistic}"
+    path = Path(cache_dir) / f"{prefix}_{key}.zarr"
+
+    if path.exists():
+        return xr.open_zarr(path, consolidated=True)[variable].load()
+
+    with stage("reduce", variable=variable, period=f"{start}-{end}",
+               statistic=statistic):
+        source = _source(variable, table_id, member, experiment, data_dir, hot)
+        da = getattr(source.sel(time=slice(start, end)), statistic)(
+            dim="time", keep_attrs=True)
+        da = da.load()
+
+    _save(da.to_dataset(name=variable), path, prefix, precision)
+    return xr.open_zarr(path, consolidated=True)[variable].load()
+
+
+def _stream_prefix(variable, table_id, groupings, baseline, member,
+                   experiment):
+    # One slot per grouping set and baseline: callers asking for different
+    # groupings must not evict each other's results in _save()
+    return (f"{variable}_{table_id}_{experiment}_{member}_stream_"
+            f"{'+'.join(sorted(groupings))}_{baseline[0]}-{baseline[1]}")
+
+
+def stream_path(variable, table_id, groupings, baseline=(2020, 2029),
+                member="r1i1p1f2", experiment="G6sulfur", data_dir=DATA_DIR,
+                cache_dir=REDUCTION_DIR, precision=PRECISION):
+    """Where reduce_stream() caches these groupings for the current files."""
+    groupings = tuple(sorted(groupings))
+    baseline = tuple(int(b) for b in baseline)
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+    key = cache_key(variable, table_id, member, experiment, baseline,
+                    "+".join(groupings), fingerprint(entries), precision)
+    prefix = _stream_prefix(variable, table_id, groupings, baseline, member,
+                            experiment)
+    return Path(cache_dir) / f"{prefix}_{key}.zarr"
+
+
+def _cached_superset(variable, table_id, groupings, baseline, member,
+                     experiment, fp, cache_dir, precision):
+    """
+    A current cached store holding every requested grouping (and, when the
+    baseline grouping is requested, the same baseline), or None.
+    """
+    base = f"{variable}_{table_id}_{experiment}_{member}_stream_"
+    for path in sorted(Path(cache_dir).glob(f"{base}*.zarr")):
+        try:
+            names, years, key = path.stem[len(base):].rsplit("_", 2)
+            have_baseline = tuple(int(y) for y in years.split("-"))
+        except ValueError:
+            continue
+        have = tuple(names.split("+"))
+        if not set(groupings) <= set(have):
+            continue
+        if "baseline" in groupings and have_baseline != baseline:
+            continue
+        # Only a store built from the current files at this precision
+        if key == cache_key(variable, table_id, member, experiment,
+                            have_baseline, "+".join(have), fp, precision):
+            return path
+    return None
+
+
+def reduce_stream(variable, table_id,
+                  groupings=("monthly_clim", "annual", "decadal"),
+                  baseline=(2020, 2029), member="r1i1p1f2",
+                  experiment="G6sulfur", data_dir=DATA_DIR,
+                  cache_dir=REDUCTION_DIR, hot=False, precision=PRECISION):
+    """
+    All `groupings` of `variable` from one streaming pass (see
+    stream_reduce.py), read from the cache when the source files are
+    unchanged. A cached store with a superset of the groupings (e.g. from
+    `pipeline.py reduce`) answers the request too, so one pass can serve
+    several callers. With hot=True a cache miss streams from the hot cache.
+    """
+    groupings = tuple(sorted(groupings))
+    baseline = tuple(int(b) for b in baseline)
+    path = stream_path(variable, table_id, groupings, baseline, member,
+                       experiment, data_dir, cache_dir, precision)
+    prefix = _stream_prefix(variable, table_id, groupings, baseline, member,
+                            experiment)
+
+    if path.exists():
+        return xr.open_zarr(path, consolidated=True).load()
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+    superset = _cached_superset(variable, table_id, groupings, baseline,
+                                member, experiment, fingerprint(entries),
+                                cache_dir, precision)
+    if superset is not None:
+        ds = xr.open_zarr(superset, consolidated=True)
+        return ds[list(groupings)].load()
+
+    with stage("reduce", variable=variable, groupings="+".join(groupings)):
+        source = _source(variable, table_id, member, experiment, data_dir, hot)
+        out = stream_reduce(source, groupings, baseline)
+
+    _save(out, path, prefix, precision)
+    return xr.open_zarr(path, consolidated=True).load()
+
+
+def clear(cache_dir=REDUCTION_DIR):
+    removed = 0
+    for path in Path(cache_dir).glob("*"):
+        if path.suffix in (".nc", ".zarr"):
+            _remove(path)
+            removed += 1
+    return removed
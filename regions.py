@@ -0,0 +1,155 @@
+# regions.py
+"""
+Named Sargassum regions and fast regional subsetting on any model grid.
+
+A lat/lon box cannot be taken with .sel(lat=slice(...)) on the POP grid
+(2-D lat/lon on nlat/nlon dims). Instead, each region's polygon is tested
+once per grid against the cell centres; the resulting row/column index
+bounds and polygon mask are cached under CACHE_DIR/regions. Readers then
+isel() only that hyperslab from the Zarr store, so just the chunks touching
+the region are read from disk.
+
+Usage:
+    python regions.py list
+    python regions.py mean --region caribbean --variable tos --table Omon
+"""
+
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from matplotlib.path import Path as Polygon
+
+from paths import CACHE_DIR
+from spatial_mean import grid_weights, spatial_dims, weighted_mean
+from zarr_store import open_store
+
+REGION_DIR = CACHE_DIR / "regions"
+
+# (label, [(lon, lat), ...]) – lon in degrees east, -180..180
+REGIONS = {
+    "caribbean": ("Caribbean Sea", [
+        (-89.0, 21.5), (-84.0, 22.0), (-76.0, 20.0), (-70.0, 19.5),
+        (-64.0, 18.5), (-59.0, 17.0), (-59.0, 10.0), (-62.0, 10.0),
+        (-72.0, 11.0), (-77.0, 8.0), (-83.0, 9.0), (-84.0, 15.0),
+        (-89.0, 16.0)]),
+    "gasb": ("Great Atlantic Sargassum Belt", [
+        (-80.0, 8.0), (-60.0, 5.0), (-45.0, 0.0), (-15.0, -2.0),
+        (12.0, 0.0), (12.0, 8.0), (-20.0, 14.0), (-45.0, 18.0),
+        (-62.0, 20.0), (-80.0, 18.0)]),
+    "gulf_of_mexico": ("Gulf of Mexico", [
+        (-98.0, 18.0), (-98.0, 31.0), (-80.5, 31.0), (-80.5, 25.0),
+        (-84.0, 22.0), (-90.0, 21.0), (-90.0, 18.0)]),
+}
+
+RegionIndex = namedtuple("RegionIndex", "dims rows cols mask")
+
+
+def _centres(template):
+    lat, lon = template.lat.values, template.lon.values
+    if lat.ndim == 1:
+        lat, lon = np.meshgrid(lat, lon, indexing="ij")
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return lat, lon
+
+
+def _span(used, n):
+    """Contiguous index run covering `used`, wrapping past n-1 if shorter."""
+    idx = np.flatnonzero(used)
+    gaps = np.diff(np.concatenate([idx, [idx[0] + n]]))
+    k = int(np.argmax(gaps))
+    if gaps[k] <= 1:
+        return np.arange(n)
+    start = idx[(k + 1) % len(idx)]
+    stop = idx[k]
+    if start <= stop:
+        return np.arange(start, stop + 1)
+    return np.concatenate([np.arange(start, n), np.arange(0, stop + 1)])
+
+
+# ------------------------------------------------------------------
+# Index – computed once per (grid, region)
+# ------------------------------------------------------------------
+def region_index(template, region, region_dir=REGION_DIR):
+    """Row/column index arrays and polygon mask of `region` on a grid."""
+    if region not in REGIONS:
+        raise KeyError(f"Unknown region '{region}' – use {list(REGIONS)}")
+    dims = spatial_dims(template)
+    shape = tuple(template.sizes[d] for d in dims)
+    path = Path(region_dir) / f"{region}_{'x'.join(map(str, shape))}.npz"
+
+    if path.exists():
+        z = np.load(path)
+        return RegionIndex(dims, z["rows"], z["cols"], z["mask"])
+
+    lat, lon = _centres(template)
+    polygon = Polygon(REGIONS[region][1])
+    inside = polygon.contains_points(
+        np.column_stack([lon.ravel(), lat.ravel()])).reshape(shape)
+    if not inside.any():
+        raise ValueError(f"Region '{region}' has no cells on a {shape} grid")
+
+    rows = _span(inside.any(axis=1), shape[0])
+    cols = _span(inside.any(axis=0), shape[1])
+    mask = inside[np.ix_(rows, cols)]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, rows=rows, cols=cols, mask=mask)
+    return RegionIndex(dims, rows, cols, mask)
+
+
+def subset(obj, index):
+    """The index hyperslab of a Dataset/DataArray, polygon mask attached."""
+    sub = obj.isel({index.dims[0]: index.rows, index.dims[1]: index.cols})
+    return sub.assign_coords(region_mask=(index.dims, index.mask))
+
+
+# ------------------------------------------------------------------
+# Readers
+# ------------------------------------------------------------------
+def open_region(variable, table_id, region, member="r1i1p1f2",
+                experiment="G6sulfur", **kwargs):
+    """Open only the `region` hyperslab of a variable's Zarr store."""
+    ds = open_store(variable, table_id, member, experiment, **kwargs)
+    return subset(ds, region_index(ds[variable], region))
+
+
+def region_mean(variable, table_id, region, member="r1i1p1f2",
+                experiment="G6sulfur", **kwargs):
+    """Area-weighted mean over the region polygon (lazy)."""
+    ds = open_store(variable, table_id, member, experiment, **kwargs)
+    da = ds[variable]
+    index = region_index(da, region)
+    w = subset(grid_weights(da, table_id, member=member,
+                            experiment=experiment), index)
+    w = w.where(w.region_mask, 0.0).drop_vars("region_mask")
+    return weighted_mean(subset(da, index).drop_vars("region_mask"), w)
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("list", "mean"))
+    parser.add_argument("--region", choices=list(REGIONS), default="caribbean")
+    parser.add_argument("--variable", default="tos")
+    parser.add_argument("--table", dest="table_id", default="Omon")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for key, (label, verts) in REGIONS.items():
+            print(f"{key:15} {label} ({len(verts)} vertices)")
+        return 0
+
+    series = region_mean(args.variable, args.table_id, args.region)
+    annual = series.groupby("time.year").mean().compute()
+    print(f"{REGIONS[args.region][0]} – annual mean {args.variable}")
+    for year, value in zip(annual.year.values, annual.values):
+        print(f"  {year}: {value:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,212 @@
+# regrid.py
+"""
+Regridding from the POP curvilinear ocean grid (tos) to the regular
+atmosphere lat/lon grid (tas).
+
+Weights are computed once per (source grid, target grid, method), stored as a
+scipy sparse matrix under CACHE_DIR/regrid and applied to every time chunk as
+a sparse mat-vec. Masked (land) source cells are dropped on the fly by
+renormalizing with the same matrix applied to the valid-data mask.
+
+Methods:
+    bilinear     – linear interpolation on a Delaunay triangulation of the
+                   source cell centres (lon wrapped at 0/360)
+    binned       – area-weighted average of all source cells whose centres
+                   fall in each target cell. Cells are not split at target
+                   edges, so this is not area-conservative.
+    nearest      – nearest source cell on the sphere
+Target cells a method cannot reach (e.g. beyond the hull) use nearest.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+import xarray as xr
+from scipy.spatial import Delaunay, cKDTree
+
+from paths import CACHE_DIR
+
+REGRID_DIR = CACHE_DIR / "regrid"
+
+METHODS = ("bilinear", "binned", "nearest")
+
+_matrices = {}
+
+
+def _xyz(lat, lon):
+    lat, lon = np.deg2rad(lat), np.deg2rad(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+def _grid_points(obj):
+    """Flattened (lat, lon) of cell centres, lon in [0, 360)."""
+    lat, lon = obj.lat.values, obj.lon.values
+    if lat.ndim == 1:
+        lat, lon = np.meshgrid(lat, lon, indexing="ij")
+    return lat.ravel(), np.mod(lon.ravel(), 360.0)
+
+
+# ------------------------------------------------------------------
+# Weight builders – each returns (rows, cols, vals) and unfilled targets
+# ------------------------------------------------------------------
+def _nearest(src_lat, src_lon, dst_lat, dst_lon, targets):
+    tree = cKDTree(_xyz(src_lat, src_lon))
+    _, idx = tree.query(_xyz(dst_lat[targets], dst_lon[targets]))
+    return targets, idx, np.ones(len(targets))
+
+
+def _bilinear(src_lat, src_lon, dst_lat, dst_lon):
+    # Pad with copies across the dateline so the hull covers 0..360
+    left = src_lon > 330.0
+    right = src_lon < 30.0
+    idx = np.concatenate([np.arange(src_lon.size), np.flatnonzero(left),
+                          np.flatnonzero(right)])
+    pts = np.column_stack([
+        np.concatenate([src_lon, src_lon[left] - 360.0,
+                        src_lon[right] + 360.0]),
+        np.concatenate([src_lat, src_lat[left], src_lat[right]]),
+    ])
+    tri = Delaunay(pts)
+
+    targets = np.column_stack([dst_lon, dst_lat])
+    simplex = tri.find_simplex(targets)
+    found = simplex >= 0
+    T = tri.transform[simplex[found]]
+    b = np.einsum("ijk,ik->ij", T[:, :2], targets[found] - T[:, 2])
+    bary = np.column_stack([b, 1.0 - b.sum(axis=1)])
+
+    rows = np.repeat(np.flatnonzero(found), 3)
+    cols = idx[tri.simplices[simplex[found]]].ravel()
+    return (rows, cols, bary.ravel()), np.flatnonzero(~found)
+
+
+def _edges(centres, lo=None, hi=None):
+    mid = 0.5 * (centres[1:] + centres[:-1])
+    first = centres[0] - (mid[0] - centres[0])
+    last = centres[-1] + (centres[-1] - mid[-1])
+    edges = np.concatenate([[first], mid, [last]])
+    if lo is not None:
+        edges = np.clip(edges, lo, hi)
+    return edges
+
+
+def _binned(src_lat, src_lon, src_area, dst):
+    lat_edges = _edges(dst.lat.values, -90.0, 90.0)
+    lon = np.mod(dst.lon.values, 360.0)
+    lon_edges = _edges(lon)
+    nlat, nlon = dst.lat.size, dst.lon.size
+
+    i = np.searchsorted(lat_edges, src_lat, side="right") - 1
+    # Shift source lon into the target edge range before binning
+    shifted = lon_edges[0] + np.mod(src_lon - lon_edges[0], 360.0)
+    j = np.searchsorted(lon_edges, shifted, side="right") - 1
+    ok = (i >= 0) & (i < nlat) & (j >= 0) & (j < nlon)
+
+    rows = (i * nlon + j)[ok]
+    cols = np.flatnonzero(ok)
+    vals = src_area[ok]
+    filled = np.zeros(nlat * nlon, dtype=bool)
+    filled[rows] = True
+    return (rows, cols, vals), np.flatnonzero(~filled)
+
+
+# ------------------------------------------------------------------
+# Weights – computed once, stored on disk
+# ------------------------------------------------------------------
+def regrid_weights(src, dst, method="bilinear", src_area=None,
+                   regrid_dir=REGRID_DIR):
+    """
+    Sparse (n_dst, n_src) matrix with rows summing to 1, mapping the grid of
+    `src` (2-D lat/lon) onto the grid of `dst` (1-D lat, lon).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}' – use {METHODS}")
+
+    src_lat, src_lon = _grid_points(src)
+    dst_lat, dst_lon = _grid_points(dst)
+    name = (f"{method}_{'x'.join(map(str, src.lat.shape))}"
+            f"_to_{dst.lat.size}x{dst.lon.size}")
+    if name in _matrices:
+        return _matrices[name]
+
+    path = Path(regrid_dir) / f"{name}.npz"
+    if path.exists():
+        W = sp.load_npz(path)
+    else:
+        print(f"Computing {method} regrid weights ({src_lat.size} → "
+              f"{dst_lat.size} cells)...")
+        n_dst = dst_lat.size
+        if method == "bilinear":
+            (rows, cols, vals), missing = _bilinear(src_lat, src_lon,
+                                                    dst_lat, dst_lon)
+        elif method == "binned":
+            area = (np.ones(src_lat.size) if src_area is None
+                    else np.nan_to_num(np.asarray(src_area).ravel()))
+            (rows, cols, vals), missing = _binned(src_lat, src_lon, area, dst)
+        else:
+            rows = cols = vals = np.empty(0)
+            missing = np.arange(n_dst)
+
+        if missing.size:
+            nr, nc, nv = _nearest(src_lat, src_lon, dst_lat, dst_lon, missing)
+            rows = np.concatenate([rows, nr])
+            cols = np.concatenate([cols, nc])
+            vals = np.concatenate([vals, nv])
+
+        W = sp.csr_matrix((vals, (rows.astype(np.int64), cols.astype(np.int64))),
+                          shape=(n_dst, src_lat.size))
+        norm = np.asarray(W.sum(axis=1)).ravel()
+        norm[norm == 0] = 1.0
+        W = sp.diags(1.0 / norm) @ W
+        W = W.tocsr()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sp.save_npz(path, W)
+
+    _matrices[name] = W
+    return W
+
+
+# ------------------------------------------------------------------
+# Apply
+# ------------------------------------------------------------------
+def _apply(block, W, out_shape):
+    lead = block.shape[:-2]
+    x = block.reshape(-1, block.shape[-2] * block.shape[-1]).T
+    valid = ~np.isnan(x)
+    num = W @ np.where(valid, x, 0.0)
+    den = W @ valid.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(den > 1e-12, num / den, np.nan)
+    return out.T.reshape(lead + out_shape).astype(block.dtype)
+
+
+def regrid(da, dst, method="bilinear", src_area=None):
+    """Regrid `da` (..., nlat, nlon) onto the lat/lon grid of `dst`."""
+    src_dims = list(da.dims[-2:])
+    W = regrid_weights(da, dst, method, src_area)
+    out_shape = (dst.lat.size, dst.lon.size)
+    if da.chunks is not None:
+        # Core dims must be one chunk; the Zarr stores tile them 96x96
+        da = da.chunk({d: -1 for d in src_dims})
+
+    out = xr.apply_ufunc(
+        _apply, da,
+        input_core_dims=[src_dims],
+        output_core_dims=[["lat", "lon"]],
+        exclude_dims=set(src_dims),
+        kwargs={"W": W, "out_shape": out_shape},
+        dask="parallelized",
+        output_dtypes=[da.dtype],
+        dask_gufunc_kwargs={"output_sizes": {"lat": out_shape[0],
+                                             "lon": out_shape[1]}},
+    )
+    out = out.drop_vars([c for c in out.coords
+                         if set(out[c].dims) & set(src_dims)], errors="ignore")
+    out = out.assign_coords(lat=dst.lat.values, lon=dst.lon.values)
+    out.attrs = dict(da.attrs)
+    out.name = da.name
+    return out
@@ -0,0 +1,145 @@
+# render.py
+"""
+Parallel batch renderer for map series (per-decade anomaly maps etc.).
+
+Each job is a MapJob(field, levels, cmap, title, out_path, ...); an
+optional boolean `stipple` field (e.g. p < 0.05) is hatched on top. Jobs are
+rendered in a process pool; every worker builds one PlateCarree figure
+template – GeoAxes, coastlines, gridlines and a fixed colorbar axes – once,
+and only swaps the filled contours, colorbar and title per job. The parent
+loads the next fields (prefetch.py) while the workers draw.
+
+Scripts that call render_jobs() with processes > 1 must guard their entry
+point with `if __name__ == "__main__":`. Workers are always spawned, never
+forked: the prefetch threads may hold HDF5/dask/zarr locks at fork time.
+"""
+
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                as_completed, wait)
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from instrument import stage
+from prefetch import DEPTH, prefetch
+
+MapJob = namedtuple(
+    "MapJob",
+    "field levels cmap title out_path cbar_label extend dpi stipple",
+    defaults=("", "both", 150, None),
+)
+
+FIGSIZE = (12, 6)
+AX_RECT = (0.04, 0.06, 0.80, 0.88)
+CAX_RECT = (0.88, 0.21, 0.018, 0.58)   # ≈ shrink=0.7
+
+_template = None
+
+
+# ------------------------------------------------------------------
+# Worker-side template
+# ------------------------------------------------------------------
+def _init_worker():
+    """Build the figure template once per process."""
+    global _template
+    import cartopy.crs as ccrs
+    from matplotlib.figure import Figure
+
+    # A bare Figure (no pyplot) so the template never touches the GUI backend
+    fig = Figure(figsize=FIGSIZE)
+    ax = fig.add_axes(AX_RECT, projection=ccrs.PlateCarree())
+    cax = fig.add_axes(CAX_RECT)
+    ax.set_global()
+    ax.coastlines()
+    ax.gridlines(draw_labels=True, alpha=0.4, linestyle='--')
+    _template = (fig, ax, cax, ccrs.PlateCarree())
+
+
+def _render(payload):
+    if _template is None:
+        _init_worker()
+    fig, ax, cax, crs = _template
+    lon, lat, values, stipple, job = payload
+
+    cs = ax.contourf(lon, lat, values, levels=job.levels, cmap=job.cmap,
+                     extend=job.extend, transform=crs)
+    hatch = None
+    if stipple is not None:
+        hatch = ax.contourf(lon, lat, stipple, levels=[0.5, 1.5],
+                            hatches=['...'], colors='none', transform=crs)
+    cax.clear()
+    fig.colorbar(cs, cax=cax, label=job.cbar_label)
+    ax.set_title(job.title, fontsize=14)
+
+    Path(job.out_path).parent.mkdir(parents=True, exist_ok=True)
+    with stage("savefig", output=Path(job.out_path).name):
+        fig.savefig(job.out_path, dpi=job.dpi, bbox_inches='tight')
+    for artist in (cs, hatch):
+        if artist is None:
+            continue
+        try:
+            artist.remove()
+        except AttributeError:   # matplotlib < 3.8
+            for coll in artist.collections:
+                coll.remove()
+    return str(job.out_path)
+
+
+# ------------------------------------------------------------------
+# Parent side
+# ------------------------------------------------------------------
+def _payload(job):
+    """Plain numpy arrays for pickling to workers (field is loaded here)."""
+    field = job.field.squeeze()
+    lat, lon = field.lat.values, field.lon.values
+    values = np.asarray(field.transpose(*field.dims[-2:]).values)
+    stipple = None
+    if job.stipple is not None:
+        mask = job.stipple.squeeze()
+        stipple = np.asarray(mask.transpose(*mask.dims[-2:]).values,
+                             dtype=float)
+    return lon, lat, values, stipple, job._replace(
+        field=None, stipple=None, levels=np.asarray(job.levels))
+
+
+def render_jobs(jobs, processes=None, prefetch_depth=DEPTH):
+    """
+    Render all jobs, in parallel unless processes == 1. Returns paths.
+
+    Fields are usually lazy; they are loaded `prefetch_depth` jobs ahead in
+    background threads while earlier jobs render, and at most two payloads
+    per worker wait in the pool queue.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    payloads = prefetch(((i, partial(_payload, job))
+                         for i, job in enumerate(jobs)), prefetch_depth)
+
+    with stage("render", jobs=len(jobs), processes=processes):
+        if processes == 1:
+            saved = [_render(p) for _, p in payloads]
+        else:
+            saved = [None] * len(jobs)
+            inflight = {}
+            # spawn: forking while prefetch threads hold locks can deadlock
+            with ProcessPoolExecutor(
+                    max_workers=processes, initializer=_init_worker,
+                    mp_context=multiprocessing.get_context("spawn")) as pool:
+                for i, p in payloads:
+                    inflight[pool.submit(_render, p)] = i
+                    if len(inflight) >= 2 * processes:
+                        done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            saved[inflight.pop(future)] = future.result()
+                for future in as_completed(inflight):
+                    saved[inflight[future]] = future.result()
+
+    for path in saved:
+        print(f"   Saved: {Path(path).name}")
+    return saved
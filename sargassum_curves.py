@@ -0,0 +1,25 @@
+# sargassum_curves.py
+"""
+Conceptual Sargassum growth-vs-temperature response curves.
+
+Shared by plt_figures.py (curves on a synthetic temperature axis) and
+suitability.py (curves applied to the model tos field).
+"""
+
+import numpy as np
+
+# key: (label, peak °C, sigma °C) – peaks chosen based on Carneiro et al.
+# (2025) summaries
+GROUPS = {
+    "polycystum": ('S. polycystum (benthic)', 24, 3.2),
+    "tropical": ('Tropical benthic Sargassum', 27, 3.5),
+    "temperate": ('Temperate benthic Sargassum', 22, 3.0),
+    "pelagic": ('Pelagic S. natans/fluitans', 27, 3.8),
+}
+
+peaks = {label: mu for label, mu, _ in GROUPS.values()}
+sigmas = {label: sigma for label, _, sigma in GROUPS.values()}
+
+
+def gaussian(x, mu, sigma):
+    return np.exp(-0.5*((x-mu)/sigma)**2)
@@ -0,0 +1,163 @@
+# search_cache.py
+"""
+On-disk cache of ESGF search results for the downloader.
+
+The cache key is the index node plus the normalized selection of every
+query in a search (facet names and values sorted, so spec order and value
+order don't matter). Results from a stand-in node (esgf_standin.py) are
+never replayed against a real one. An entry stores the dataset ids and the File fields the
+downloader uses. Within the TTL it is returned as is. After the TTL a cheap
+hit-count query decides: unchanged counts only re-stamp the entry, and
+changed counts trigger a full search. --refresh in data_download.py skips
+the cache.
+
+Usage:
+    python search_cache.py list
+    python search_cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from paths import CACHE_DIR
+
+SEARCH_DIR = CACHE_DIR / "search"
+TTL = 24 * 3600          # seconds
+
+FILE_FIELDS = ("file_id", "dataset_id", "master_id", "url", "version",
+               "filename", "local_path", "data_node", "checksum",
+               "checksum_type", "size", "sha")
+
+
+def normalize(selection):
+    """Sorted {facet: sorted [values]} of a Query.selection."""
+    raw = selection.asdict() if hasattr(selection, "asdict") else dict(selection)
+    out = {}
+    for facet, values in raw.items():
+        if values in (None, "", [], ()):
+            continue
+        if isinstance(values, str):
+            values = [values]
+        out[facet] = sorted(str(v) for v in values)
+    return dict(sorted(out.items()))
+
+
+def cache_key(queries, index_node=""):
+    selections = sorted(json.dumps(normalize(q.selection), sort_keys=True)
+                        for q in queries)
+    payload = "\n".join([str(index_node or "")] + selections)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def entry_path(key, search_dir=SEARCH_DIR):
+    return Path(search_dir) / f"{key}.json"
+
+
+# ------------------------------------------------------------------
+# (De)serialize esgpull Files
+# ------------------------------------------------------------------
+def _dump_file(file):
+    return {k: getattr(file, k, None) for k in FILE_FIELDS}
+
+
+def _load_file(fields):
+    from esgpull.models import File
+
+    file = File(**{k: v for k, v in fields.items() if k != "sha"})
+    if fields.get("sha"):
+        file.sha = fields["sha"]
+    elif hasattr(file, "compute_sha"):
+        file.compute_sha()
+    return file
+
+
+# ------------------------------------------------------------------
+# Search
+# ------------------------------------------------------------------
+def _hits(esg, queries):
+    return [int(h) for h in esg.context.hits(*queries, file=True)]
+
+
+def _store(path, queries, hits, dataset_ids, files, index_node=None):
+    now = time.time()
+    entry = {"created": now, "checked": now, "hits": hits,
+             "index_node": index_node,
+             "selections": [normalize(q.selection) for q in queries],
+             "datasets": dataset_ids,
+             "files": [_dump_file(f) for f in files]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(entry, fh, indent=1, default=str)
+    return entry
+
+
+def search(esg, queries, ttl=TTL, refresh=False, search_dir=SEARCH_DIR):
+    """
+    (dataset_ids, files) for `queries`, from the cache when it is fresh or
+    the hit counts are unchanged, else from the index node.
+    """
+    index_node = esg.config.api.index_node
+    path = entry_path(cache_key(queries, index_node), search_dir)
+    entry = None
+    if path.exists() and not refresh:
+        with open(path) as fh:
+            entry = json.load(fh)
+
+    if entry is not None:
+        age = time.time() - entry["checked"]
+        if age < ttl:
+            print(f"Search cache hit ({age / 3600:.1f} h old)")
+            return entry["datasets"], [_load_file(f) for f in entry["files"]]
+        hits = _hits(esg, queries)
+        if hits == entry["hits"]:
+            print("Search cache expired – hit counts unchanged, reusing")
+            entry["checked"] = time.time()
+            with open(path, "w") as fh:
+                json.dump(entry, fh, indent=1, default=str)
+            return entry["datasets"], [_load_file(f) for f in entry["files"]]
+        print("Search cache expired – index changed, searching again")
+    else:
+        hits = None
+
+    datasets = esg.context.datasets(*queries)
+    files = esg.context.files(*queries)
+    if hits is None:
+        hits = _hits(esg, queries)
+    _store(path, queries, hits, [ds.dataset_id for ds in datasets], files,
+           index_node)
+    return [ds.dataset_id for ds in datasets], files
+
+
+def clear(search_dir=SEARCH_DIR):
+    removed = 0
+    for path in Path(search_dir).glob("*.json"):
+        path.unlink()
+        removed += 1
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("list", "clear"))
+    args = parser.parse_args(argv)
+
+    if args.command == "clear":
+        print(f"Removed {clear()} cached search(es)")
+        return 0
+    for path in sorted(SEARCH_DIR.glob("*.json")):
+        with open(path) as fh:
+            entry = json.load(fh)
+        facets = ", ".join("/".join(s.get("variable_id", ["?"]))
+                           for s in entry["selections"])
+        age = (time.time() - entry["checked"]) / 3600
+        print(f"{path.stem}  {len(entry['files']):4d} file(s)  "
+              f"checked {age:6.1f} h ago  [{facets}]  "
+              f"{entry.get('index_node') or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
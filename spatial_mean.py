@@ -0,0 +1,182 @@
+# spatial_mean.py
+"""
+Area-weighted spatial means using the model's own cell areas.
+
+The old global_mean helpers weighted by cos(lat) and averaged over
+['lat', 'lon'], which is wrong for the POP ocean grid (2-D lat/lon on
+nlat/nlon dims). Here the cell areas (areacella for Amon, areacello for Omon)
+are taken from the catalog, downloaded on first use if missing, and cached
+once per grid as normalized weights under CACHE_DIR/weights. When no area
+file can be found or downloaded, a <key>.fallback marker is left there and
+later runs use cos(lat) weights without trying ESGF again (an area file
+that appears in the catalog is still picked up; delete the marker to retry
+the download).
+
+Means are computed as two dot products per time chunk (weighted sum of the
+valid data and sum of the valid weights) with xr.dot, so masked cells such
+as land in tos are handled without building weighted() objects.
+"""
+
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+import catalog
+from paths import CACHE_DIR, DATA_DIR
+
+WEIGHTS_DIR = CACHE_DIR / "weights"
+
+AREA_FOR_TABLE = {
+    "Amon": ("areacella", "fx"),
+    "day": ("areacella", "fx"),
+    "Omon": ("areacello", "Ofx"),
+    "Oday": ("areacello", "Ofx"),
+}
+
+# fx/Ofx fields are often only published for historical/piControl
+FALLBACK_RUNS = (("historical", "r1i1p1f1"), ("piControl", "r1i1p1f1"))
+
+_weights = {}
+
+
+def spatial_dims(da):
+    """The two horizontal dims (lat/lon or nlat/nlon) – always the last two."""
+    return da.dims[-2:]
+
+
+# ------------------------------------------------------------------
+# Cell areas
+# ------------------------------------------------------------------
+def _find_area(area_var, area_table, member, experiment, data_dir):
+    entries = catalog.find(area_var, area_table, data_dir=data_dir)
+    for e in entries:
+        if (e.experiment, e.member) == (experiment, member):
+            return e.path
+    return entries[0].path if entries else None
+
+
+def _download_area(area_var, area_table, member, experiment, data_dir):
+    from data_download import (Spec, download, init_esgpull, local_file,
+                               resolve)
+
+    esg = init_esgpull(data_dir)
+    for exp, mem in ((experiment, member),) + FALLBACK_RUNS:
+        files = resolve(esg, [Spec(area_var, area_table, mem, exp)])
+        if files:
+            download(esg, files, data_dir=data_dir)
+            catalog.record_downloads(
+                [(local_file(f, data_dir), f.checksum) for f in files],
+                data_dir)
+            return local_file(files[0], data_dir)
+    return None
+
+
+def cell_area(table_id, member="r1i1p1f2", experiment="G6sulfur",
+              data_dir=DATA_DIR, download=True):
+    """
+    Cell-area DataArray for the grid of `table_id`, or None if unavailable.
+    With download=False only the local catalog is searched.
+    """
+    area_var, area_table = AREA_FOR_TABLE[table_id]
+    path = _find_area(area_var, area_table, member, experiment, data_dir)
+    if path is None and download:
+        try:
+            path = _download_area(area_var, area_table, member, experiment,
+                                  data_dir)
+        except Exception as e:
+            print(f"  Warning: could not download {area_var}: {e}")
+    if path is None or not Path(path).exists():
+        return None
+    with xr.open_dataset(path) as ds:
+        return ds[area_var].load()
+
+
+# ------------------------------------------------------------------
+# Normalized weights – built once per grid
+# ------------------------------------------------------------------
+def grid_weights(template, table_id="Amon", member="r1i1p1f2",
+                 experiment="G6sulfur", data_dir=DATA_DIR,
+                 weights_dir=WEIGHTS_DIR):
+    """
+    Normalized area weights (sum to 1) on the horizontal grid of `template`.
+    """
+    dims = spatial_dims(template)
+    shape = tuple(template.sizes[d] for d in dims)
+    area_var = AREA_FOR_TABLE[table_id][0]
+    key = f"{area_var}_{'x'.join(map(str, shape))}"
+
+    if key not in _weights:
+        path = Path(weights_dir) / f"{key}.npy"
+        marker = path.with_suffix(".fallback")
+        if path.exists():
+            w = np.load(path)
+        else:
+            area = cell_area(table_id, member, experiment, data_dir,
+                             download=not marker.exists())
+            if area is not None and area.shape == shape:
+                w = np.where(np.isfinite(area.values), area.values, 0.0)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                marker.unlink(missing_ok=True)
+            else:
+                warnings.warn(f"{area_var} unavailable for {shape} grid – "
+                              f"falling back to cos(lat) weights "
+                              f"(delete {marker} to retry the download)")
+                if not marker.exists():
+                    marker.parent.mkdir(parents=True, exist_ok=True)
+                    marker.write_text(f"{area_var} unavailable for "
+                                      f"{experiment} {member} on "
+                                      f"{time.strftime('%Y-%m-%d %H:%M')}\n")
+                lat = template.lat
+                w = np.broadcast_to(np.cos(np.deg2rad(lat)).values
+                                    if lat.ndim == 2 else
+                                    np.cos(np.deg2rad(lat.values))[:, None],
+                                    shape).copy()
+                path = None
+            w = w / w.sum()
+            if path is not None:
+                np.save(path, w)
+        _weights[key] = w
+
+    return xr.DataArray(_weights[key], dims=dims)
+
+
+# ------------------------------------------------------------------
+# Means
+# ------------------------------------------------------------------
+def weighted_mean(da, weights):
+    """sum(w * x) / sum(w) over valid cells, as two dot products."""
+    dims = spatial_dims(da)
+    num = xr.dot(da.fillna(0), weights, dims=dims)
+    den = xr.dot(da.notnull().astype(weights.dtype), weights, dims=dims)
+    out = num / den
+    out.attrs = {k: v for k, v in da.attrs.items()
+                 if k in ("units", "long_name", "standard_name")}
+    out.name = da.name
+    return out
+
+
+def global_mean(da, table_id="Amon", **kwargs):
+    return weighted_mean(da, grid_weights(da, table_id, **kwargs))
+
+
+def regional_mean(da, mask, table_id="Amon", **kwargs):
+    """Mean over cells where `mask` (horizontal-dims boolean) is True."""
+    w = grid_weights(da, table_id, **kwargs)
+    mask = np.asarray(mask, dtype=bool)
+    return weighted_mean(da, w.where(mask, 0.0))
+
+
+def hemispheric_means(da, table_id="Amon", **kwargs):
+    """Global, NH and SH means in one Dataset."""
+    lat = da.lat
+    if lat.ndim == 1:
+        lat = lat.broadcast_like(da.isel({d: 0 for d in da.dims
+                                          if d not in spatial_dims(da)}))
+    return xr.Dataset({
+        "global": global_mean(da, table_id, **kwargs),
+        "nh": regional_mean(da, (lat >= 0).values, table_id, **kwargs),
+        "sh": regional_mean(da, (lat < 0).values, table_id, **kwargs),
+    })
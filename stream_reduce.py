@@ -0,0 +1,127 @@
+# stream_reduce.py
+"""
+Single-pass streaming reducer over the full time axis.
+
+Instead of one .sel(time=...).mean() per decade plus separate annual and
+decadal resamples (each re-reading the record), the data is streamed once in
+time chunks. Running sums and counts are kept for every requested grouping at
+the same time:
+
+    monthly_clim – calendar-month climatology (12 fields)
+    annual       – one field per year
+    decadal      – one field per decade (2020, 2030, ...)
+    baseline     – mean over a (start_year, end_year) period
+
+Memory is one time chunk plus the accumulators. The monthly_clim, baseline
+and decadal accumulators are small and fixed or nearly so, but annual keeps
+a float64 sum and a count field per year and grows with the record length
+(a 500-year run holds 500 of each until means() is called).
+"""
+
+import numpy as np
+import xarray as xr
+
+GROUPINGS = ("monthly_clim", "annual", "decadal", "baseline")
+
+TIME_CHUNK = 120   # matches the Zarr store time chunk
+
+
+def _labels(grouping, years, months, baseline):
+    if grouping == "monthly_clim":
+        return months
+    if grouping == "annual":
+        return years
+    if grouping == "decadal":
+        return years // 10 * 10
+    if grouping == "baseline":
+        start, end = baseline
+        return np.where((years >= start) & (years <= end), 0, -1)
+    raise ValueError(f"Unknown grouping '{grouping}' – use {GROUPINGS}")
+
+
+class _Accumulator:
+    """Running nan-aware sum and count per group label."""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.sums = {}
+        self.counts = {}
+
+    def add(self, label, block):
+        valid = ~np.isnan(block)
+        s = np.where(valid, block, 0.0).sum(axis=0, dtype=np.float64)
+        n = valid.sum(axis=0, dtype=np.int32)
+        if label in self.sums:
+            self.sums[label] += s
+            self.counts[label] += n
+        else:
+            self.sums[label] = s
+            self.counts[label] = n
+
+    def means(self):
+        labels = sorted(self.sums)
+        out = np.empty((len(labels),) + self.shape, dtype=np.float64)
+        for i, label in enumerate(labels):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[i] = np.where(self.counts[label] > 0,
+                                  self.sums[label] / self.counts[label],
+                                  np.nan)
+        return labels, out
+
+
+def stream_reduce(da, groupings=("monthly_clim", "annual", "decadal"),
+                  baseline=(2020, 2029), time_chunk=TIME_CHUNK, dtype=None):
+    """
+    Reduce `da` (dims: time, ...) for all `groupings` in one pass.
+
+    Returns a Dataset with one variable per grouping: monthly_clim(month, ...),
+    annual(year, ...), decadal(decade, ...) and baseline(...).
+    """
+    groupings = tuple(groupings)
+    for g in groupings:
+        if g not in GROUPINGS:
+            raise ValueError(f"Unknown grouping '{g}' – use {GROUPINGS}")
+
+    da = da.transpose("time", ...)
+    spatial_dims = da.dims[1:]
+    shape = tuple(da.sizes[d] for d in spatial_dims)
+    years_all = da.time.dt.year.values
+    months_all = da.time.dt.month.values
+
+    acc = {g: _Accumulator(shape) for g in groupings}
+
+    nt = da.sizes["time"]
+    for i in range(0, nt, time_chunk):
+        block = np.asarray(da.isel(time=slice(i, i + time_chunk)).values,
+                           dtype=np.float64)
+        years = years_all[i:i + time_chunk]
+        months = months_all[i:i + time_chunk]
+        for g in groupings:
+            labels = _labels(g, years, months, baseline)
+            for label in np.unique(labels):
+                if g == "baseline" and label < 0:
+                    continue
+                acc[g].add(int(label), block[labels == label])
+
+    dim_names = {"monthly_clim": "month", "annual": "year",
+                 "decadal": "decade"}
+    coords = {name: da.coords[name] for name in da.coords
+              if set(da.coords[name].dims) <= set(spatial_dims)}
+    out = xr.Dataset(coords=coords)
+    for g in groupings:
+        labels, means = acc[g].means()
+        if dtype is not None:
+            means = means.astype(dtype)
+        if g == "baseline":
+            if not labels:
+                raise ValueError(f"No data in baseline period {baseline}")
+            out[g] = (spatial_dims, means[0])
+            out[g].attrs["period"] = f"{baseline[0]}-{baseline[1]}"
+        else:
+            dim = dim_names[g]
+            out[g] = ((dim,) + spatial_dims, means)
+            out = out.assign_coords({dim: labels})
+        out[g].attrs.update({k: v for k, v in da.attrs.items()
+                             if k in ("units", "long_name", "standard_name")})
+    out.attrs["variable"] = da.name or ""
+    return out
@@ -0,0 +1,123 @@
+# suitability.py
+"""
+Sargassum thermal-suitability index from model tos.
+
+Applies the growth-vs-temperature curves from sargassum_curves.py to the real
+monthly tos field instead of a synthetic temperature axis. All species groups
+are evaluated at once by broadcasting a `group` dim against the chunked tos
+data from the same Zarr store the SST anomaly maps use, and reduced per
+decade to
+
+    relative_growth – decadal mean of the normalized growth response
+    suitable_months – mean number of months per year with growth ≥ threshold
+
+Usage:
+    python suitability.py                       # all groups, threshold 0.5
+    python suitability.py --groups pelagic tropical --threshold 0.7
+"""
+
+import argparse
+
+import dask
+import numpy as np
+import xarray as xr
+
+from instrument import stage
+from paths import FIGURES_DIR
+from render import MapJob, render_jobs
+from sargassum_curves import GROUPS
+from zarr_store import open_store
+
+THRESHOLD = 0.5
+
+
+def to_celsius(da):
+    if da.attrs.get("units", "degC") in ("K", "kelvin", "Kelvin"):
+        da = da - 273.15
+    return da
+
+
+def group_curves(groups=None):
+    """Peak and width per group as DataArrays along a `group` dim."""
+    keys = list(groups or GROUPS)
+    mu = xr.DataArray([GROUPS[k][1] for k in keys], dims="group",
+                      coords={"group": keys})
+    sigma = xr.DataArray([GROUPS[k][2] for k in keys], dims="group",
+                         coords={"group": keys})
+    return mu, sigma
+
+
+def suitability(tos, groups=None, threshold=THRESHOLD):
+    """
+    Decadal relative growth and suitable months per year for every group,
+    from monthly `tos` (time, ...). Lazy until computed together.
+    """
+    mu, sigma = group_curves(groups)
+    temp = to_celsius(tos)
+    growth = np.exp(-0.5 * ((temp - mu) / sigma) ** 2)   # (group, time, ...)
+
+    decade = (growth.time.dt.year // 10 * 10).rename("decade")
+    year = growth.time.dt.year.rename("year")
+
+    relative = growth.groupby(decade).mean("time")
+    months = (growth >= threshold).where(temp.notnull())
+    months_per_year = months.groupby(year).sum("time", min_count=1)
+    suitable = months_per_year.groupby(
+        (months_per_year.year // 10 * 10).rename("decade")).mean("year")
+
+    out = xr.Dataset({"relative_growth": relative,
+                      "suitable_months": suitable})
+    out.attrs["threshold"] = threshold
+    return out
+
+
+def compute_suitability(groups=None, threshold=THRESHOLD, member="r1i1p1f2",
+                        experiment="G6sulfur"):
+    ds = open_store("tos", "Omon", member, experiment)
+    out = suitability(ds.tos, groups, threshold)
+    with stage("compute", what="suitability", groups=len(out.group)):
+        rel, months = dask.compute(out.relative_growth, out.suitable_months)
+    return out.assign(relative_growth=rel, suitable_months=months)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--groups", nargs="+", choices=list(GROUPS),
+                        default=list(GROUPS))
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Relative growth counted as a suitable month")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    print(f"Evaluating {len(args.groups)} group(s) over the tos record...")
+    out = compute_suitability(args.groups, args.threshold)
+
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for key in args.groups:
+        label = GROUPS[key][0]
+        for decade in out.decade.values:
+            sel = out.sel(group=key, decade=decade)
+            jobs.append(MapJob(
+                field=sel.relative_growth, levels=np.linspace(0, 1, 11),
+                cmap='YlGn', extend='neither',
+                title=f"{label} – relative growth {decade}s",
+                out_path=FIGURES_DIR / f"suitability_growth_{key}_{decade}.png",
+                cbar_label='Relative growth (normalized)',
+            ))
+            jobs.append(MapJob(
+                field=sel.suitable_months, levels=np.arange(0, 13),
+                cmap='viridis', extend='neither',
+                title=f"{label} – suitable months/yr {decade}s "
+                      f"(growth ≥ {args.threshold})",
+                out_path=FIGURES_DIR / f"suitability_months_{key}_{decade}.png",
+                cbar_label='Months per year',
+            ))
+
+    print(f"\nRendering {len(jobs)} map(s)...")
+    render_jobs(jobs, args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
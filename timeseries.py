@@ -0,0 +1,207 @@
+# timeseries.py
+"""
+Aligned global-mean time-series table for any number of variables.
+
+Every variable's area-weighted global mean is built lazily from its Zarr
+store and all of them are evaluated in one dask.compute, so the graph runs
+once and each store is read once. The series are aligned on a complete
+monthly axis spanning the union of their records: months a variable is
+missing (e.g. the rsds gap after 2070) are explicit NaN rows, and every gap
+is listed in the sidecar metadata instead of being bridged by a plot line.
+
+The table is written to CACHE_DIR/timeseries as Parquet (CSV when no
+Parquet engine is installed) next to a JSON sidecar holding the source
+fingerprints, so it is only rebuilt when a variable's files change.
+
+Usage:
+    python timeseries.py                              # tas + rsds
+    python timeseries.py --variables tas:Amon tos:Omon rsds:Amon --csv
+"""
+
+import argparse
+import json
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import catalog
+from instrument import stage
+from paths import CACHE_DIR, DATA_DIR
+from zarr_store import fingerprint
+
+SERIES_DIR = CACHE_DIR / "timeseries"
+
+DEFAULT_VARIABLES = (("tas", "Amon"), ("rsds", "Amon"))
+
+
+def table_path(variables, member, experiment, fmt, series_dir=SERIES_DIR):
+    names = "+".join(v for v, _ in variables)
+    return Path(series_dir) / f"global_mean_{names}_{experiment}_{member}.{fmt}"
+
+
+def _parquet_engine():
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return engine
+        except ImportError:
+            continue
+    return None
+
+
+def _month_index(time):
+    """First-of-month timestamps for any calendar (cftime or numpy)."""
+    return pd.to_datetime(pd.DataFrame({"year": time.dt.year.values,
+                                        "month": time.dt.month.values,
+                                        "day": 1}))
+
+
+def gaps(df):
+    """{column: [(first_month, last_month, n_months), ...]} of NaN runs."""
+    out = {}
+    for name, col in df.items():
+        missing = col.isna().to_numpy()
+        if not missing.any():
+            continue
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], missing, [0]])))
+        out[name] = [(df.index[a].strftime("%Y-%m"),
+                      df.index[b - 1].strftime("%Y-%m"), int(b - a))
+                     for a, b in zip(edges[::2], edges[1::2])]
+    return out
+
+
+# ------------------------------------------------------------------
+# Build
+# ------------------------------------------------------------------
+def build(variables=DEFAULT_VARIABLES, member="r1i1p1f2",
+          experiment="G6sulfur", data_dir=DATA_DIR, chunks=None):
+    """
+    DataFrame of monthly global means, one column per variable. `chunks` is
+    passed to open_store (None keeps the on-disk chunks).
+    """
+    import dask
+
+    from spatial_mean import global_mean
+    from zarr_store import open_store
+
+    lazy = {}
+    for variable, table_id in variables:
+        ds = open_store(variable, table_id, member, experiment,
+                        data_dir=data_dir, chunks=chunks)
+        lazy[variable] = global_mean(ds[variable], table_id, member=member,
+                                     experiment=experiment, data_dir=data_dir)
+
+    with stage("compute", what="global mean table", variables=list(lazy)):
+        # Persisted together (on the cluster under --distributed), then
+        # gathered; the series are small
+        series = dask.compute(*dask.persist(*lazy.values()))
+
+    columns = {}
+    for name, da in zip(lazy, series):
+        s = pd.Series(da.values, index=_month_index(da.time), name=name)
+        columns[name] = s[~s.index.duplicated()]
+    df = pd.DataFrame(columns)
+
+    # Complete monthly axis so every gap is an explicit NaN row
+    full = pd.date_range(df.index.min(), df.index.max(), freq="MS")
+    df = df.reindex(full)
+    df.index.name = "month"
+    df.attrs["units"] = {name: da.attrs.get("units", "")
+                         for name, da in zip(lazy, series)}
+    return df
+
+
+def write(df, path, sources):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        df.to_parquet(path, engine=_parquet_engine())
+    else:
+        df.to_csv(path)
+    meta = {"sources": sources, "units": df.attrs.get("units", {}),
+            "gaps": gaps(df)}
+    with open(path.with_suffix(".json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    return path
+
+
+def _read(path):
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path, engine=_parquet_engine())
+    else:
+        df = pd.read_csv(path, index_col="month", parse_dates=["month"])
+    with open(path.with_suffix(".json")) as fh:
+        meta = json.load(fh)
+    df.attrs.update(units=meta["units"], gaps=meta["gaps"])
+    return df, meta
+
+
+def open_table(variables=DEFAULT_VARIABLES, member="r1i1p1f2",
+               experiment="G6sulfur", data_dir=DATA_DIR, fmt=None,
+               series_dir=SERIES_DIR, chunks=None):
+    """
+    The global-mean table, rebuilt only when a variable's source files
+    changed. Variables without files are left out with a warning.
+    df.attrs["gaps"] lists every missing-month run per column. `chunks`
+    only affects how a rebuild reads the stores, not the cached table.
+    """
+    if fmt is None:
+        fmt = "parquet" if _parquet_engine() else "csv"
+
+    sources, present = {}, []
+    for variable, table_id in variables:
+        entries = catalog.find(variable, table_id, member=member,
+                               experiment=experiment, data_dir=data_dir)
+        if not entries:
+            warnings.warn(f"No {variable}_{table_id} files for {experiment} "
+                          f"{member} – leaving it out of the table")
+            continue
+        sources[variable] = fingerprint(entries)
+        present.append((variable, table_id))
+    if not present:
+        raise FileNotFoundError("None of the requested variables have files")
+
+    path = table_path(present, member, experiment, fmt, series_dir)
+    if path.exists() and path.with_suffix(".json").exists():
+        df, meta = _read(path)
+        if meta["sources"] == sources:
+            return df
+        print(f"{path.name} is stale – rebuilding")
+
+    print(f"Building global-mean table for {', '.join(sources)}...")
+    write(build(present, member, experiment, data_dir, chunks), path, sources)
+    return _read(path)[0]
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def _parse_variable(text):
+    variable, _, table_id = text.partition(":")
+    return variable, table_id or "Amon"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variables", nargs="+", type=_parse_variable,
+                        default=list(DEFAULT_VARIABLES),
+                        metavar="VAR[:TABLE]")
+    parser.add_argument("--member", default="r1i1p1f2")
+    parser.add_argument("--experiment", default="G6sulfur")
+    parser.add_argument("--csv", action="store_true",
+                        help="Write CSV even if a Parquet engine is available")
+    args = parser.parse_args(argv)
+
+    df = open_table(args.variables, args.member, args.experiment,
+                    fmt="csv" if args.csv else None)
+    print(df.describe().T[["count", "mean", "min", "max"]])
+    for name, runs in df.attrs["gaps"].items():
+        for first, last, n in runs:
+            print(f"  gap in {name}: {first} → {last} ({n} months)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
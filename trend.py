@@ -0,0 +1,176 @@
+# trend.py
+"""
+Per-gridpoint trend and significance maps.
+
+Fits every grid cell at once with batched array arithmetic over the whole
+(time × cells) block – never a Python loop per cell:
+
+    ols        – least-squares slope with a two-sided t-test p-value
+    theilsen   – Theil–Sen median slope with a Mann–Kendall p-value
+
+Cells with missing years (e.g. land in tos) use only their valid samples;
+all-missing cells come out NaN. Inputs are annual means from the cached
+streaming reducer, so the fit reads one small (year, ...) array.
+
+Usage:
+    python trend.py                         # tas, tos, rsds – OLS
+    python trend.py --method theilsen --alpha 0.05
+"""
+
+import argparse
+import warnings
+
+import numpy as np
+import xarray as xr
+from scipy import stats
+
+from instrument import stage
+from paths import FIGURES_DIR
+from reduce_cache import reduce_stream
+from render import MapJob, render_jobs
+
+METHODS = ("ols", "theilsen")
+
+# Pairwise Theil–Sen slopes are built for this many values at a time
+PAIR_BLOCK = 20_000_000
+
+
+# ------------------------------------------------------------------
+# Batched fits – y is (ncell, nt), t is (nt,)
+# ------------------------------------------------------------------
+def ols(y, t):
+    valid = ~np.isnan(y)
+    n = valid.sum(axis=1)
+    yv = np.where(valid, y, 0.0)
+    tv = np.where(valid, t, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tbar = tv.sum(axis=1) / n
+        ybar = yv.sum(axis=1) / n
+        dt = np.where(valid, t - tbar[:, None], 0.0)
+        dy = np.where(valid, y - ybar[:, None], 0.0)
+        sxx = (dt * dt).sum(axis=1)
+        sxy = (dt * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+        slope = sxy / sxx
+        dof = n - 2
+        s2 = np.maximum(syy - slope * sxy, 0.0) / dof
+        tstat = slope / np.sqrt(s2 / sxx)
+        p = 2.0 * stats.t.sf(np.abs(tstat), dof)
+    bad = dof < 1
+    slope[bad] = np.nan
+    p[bad] = np.nan
+    return slope, p
+
+
+def theilsen(y, t):
+    ncell, nt = y.shape
+    i, j = np.triu_indices(nt, k=1)
+    dt = (t[j] - t[i])
+    step = max(1, PAIR_BLOCK // max(len(i), 1))
+
+    slope = np.empty(ncell)
+    s_stat = np.empty(ncell)
+    for c in range(0, ncell, step):
+        dy = y[c:c + step, j] - y[c:c + step, i]          # (cells, pairs)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN cells
+            slope[c:c + step] = np.nanmedian(dy / dt, axis=1)
+        s_stat[c:c + step] = np.nansum(np.sign(dy), axis=1)
+
+    # Mann–Kendall (no tie correction)
+    n = (~np.isnan(y)).sum(axis=1)
+    var = n * (n - 1) * (2 * n + 5) / 18.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (s_stat - np.sign(s_stat)) / np.sqrt(var)
+    p = 2.0 * stats.norm.sf(np.abs(z))
+    bad = n < 3
+    slope[bad] = np.nan
+    p[bad] = np.nan
+    return slope, p
+
+
+def _fit(block, t, method):
+    lead = block.shape[:-1]
+    y = block.reshape(-1, block.shape[-1]).astype(np.float64)
+    slope, p = (ols if method == "ols" else theilsen)(y, t)
+    return slope.reshape(lead), p.reshape(lead)
+
+
+# ------------------------------------------------------------------
+# xarray interface
+# ------------------------------------------------------------------
+def trend_map(da, dim="year", method="ols", per=10):
+    """
+    Slope (units per `per` steps of `dim`, default per decade for annual
+    data) and p-value at every cell of `da`.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}' – use {METHODS}")
+    t = np.asarray(da[dim].values, dtype=np.float64)
+
+    slope, p = xr.apply_ufunc(
+        _fit, da,
+        input_core_dims=[[dim]],
+        output_core_dims=[[], []],
+        kwargs={"t": t, "method": method},
+        dask="parallelized",
+        output_dtypes=[np.float64, np.float64],
+    )
+    units = da.attrs.get("units", "")
+    out = xr.Dataset({"slope": slope * per, "p_value": p})
+    out["slope"].attrs["units"] = f"{units} per {per} {dim}s".strip()
+    out.attrs["method"] = method
+    return out
+
+
+def annual_trend(variable, table_id, method="ols", member="r1i1p1f2",
+                 experiment="G6sulfur"):
+    """Per-decade trend of the annual means of a variable."""
+    annual = reduce_stream(variable, table_id, groupings=("annual",),
+                           member=member, experiment=experiment).annual
+    annual.attrs.setdefault("units", "")
+    with stage("compute", what="trend", variable=variable, method=method):
+        return trend_map(annual, dim="year", method=method).load()
+
+
+# ------------------------------------------------------------------
+# Maps
+# ------------------------------------------------------------------
+VARIABLES = {
+    "tas": ("Amon", "RdBu_r", np.linspace(-1, 1, 21)),
+    "tos": ("Omon", "RdBu_r", np.linspace(-0.5, 0.5, 21)),
+    "rsds": ("Amon", "PuOr_r", np.linspace(-4, 4, 17)),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variables", nargs="+", default=list(VARIABLES))
+    parser.add_argument("--method", choices=METHODS, default="ols")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="Stipple cells with p < alpha")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for variable in args.variables:
+        table_id, cmap, levels = VARIABLES[variable]
+        print(f"Fitting {args.method} trend for {variable}...")
+        tr = annual_trend(variable, table_id, args.method)
+        jobs.append(MapJob(
+            field=tr.slope, levels=levels, cmap=cmap,
+            title=f"G6sulfur {variable} trend ({args.method}), "
+                  f"stippled p < {args.alpha}",
+            out_path=FIGURES_DIR / f"trend_{variable}_{args.method}.png",
+            cbar_label=tr.slope.attrs["units"],
+            stipple=tr.p_value < args.alpha,
+        ))
+
+    print(f"\nRendering {len(jobs)} map(s)...")
+    render_jobs(jobs, args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
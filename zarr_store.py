@@ -0,0 +1,210 @@
+# zarr_store.py
+"""
+Consolidate the per-decade CMIP6 NetCDF files into one Zarr store per
+variable/member/experiment.
+
+The raw files are opened, concatenated and time-sorted once here; every
+analysis script then opens the store directly with consolidated metadata.
+Stores remember the checksums of the files they were built from and are
+rebuilt automatically when the catalog changes.
+
+Chunking: one chunk holds 120 months (a decade) over a 96x96 horizontal
+tile. A decadal map reduction reads exactly one time chunk, a global-mean
+time series reads every tile once, and regional reads only touch the tiles
+they overlap.
+
+Usage:
+    python zarr_store.py                      # convert everything in the catalog
+    python zarr_store.py --variable tos --table Omon
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+import numcodecs
+import xarray as xr
+import zarr
+
+import catalog
+from instrument import stage
+from paths import DATA_DIR
+
+STORE_DIR = DATA_DIR / "zarr"
+
+TIME_CHUNK = 120      # months – one decade
+SPATIAL_TILE = 96     # cells per horizontal chunk edge
+
+# zarr 3 takes `compressors=` with zarr.codecs; zarr 2 `compressor=` with numcodecs
+ZARR3 = int(zarr.__version__.split(".")[0]) >= 3
+
+KEEP_ENCODING = ("units", "calendar", "_FillValue", "dtype")
+
+# Prefetch threads may open the same missing store at once; convert it once
+_convert_lock = threading.Lock()
+
+
+def store_path(variable, table_id, member, experiment, store_dir=STORE_DIR):
+    return Path(store_dir) / f"{variable}_{table_id}_{experiment}_{member}.zarr"
+
+
+def fingerprint(entries):
+    """Hash of the source files (name, size, checksum) a store is built from."""
+    h = hashlib.sha256()
+    for e in sorted(entries, key=lambda e: Path(e.path).name):
+        h.update(f"{Path(e.path).name}:{e.size}:{e.sha}\n".encode())
+    return h.hexdigest()
+
+
+def compression(kind="blosc", level=5):
+    """
+    The encoding entry selecting a compressor, for whichever zarr is
+    installed. kind is "blosc" (zstd + bitshuffle), "zstd" or "none".
+    """
+    if ZARR3:
+        from zarr.codecs import BloscCodec, ZstdCodec
+
+        codecs = {"blosc": lambda: (BloscCodec(cname="zstd", clevel=level,
+                                               shuffle="bitshuffle"),),
+                  "zstd": lambda: (ZstdCodec(level=level),),
+                  "none": lambda: None}
+        key = "compressors"
+    else:
+        codecs = {"blosc": lambda: numcodecs.Blosc(
+                      cname="zstd", clevel=level,
+                      shuffle=numcodecs.Blosc.BITSHUFFLE),
+                  "zstd": lambda: numcodecs.Zstd(level=level),
+                  "none": lambda: None}
+        key = "compressor"
+    if kind not in codecs:
+        raise ValueError(f"Unknown compressor '{kind}' – use {list(codecs)}")
+    return {key: codecs[kind]()}
+
+
+def time_invariant(table_id, entries=()):
+    """fx/Ofx tables (cell areas, masks) and files without a date range."""
+    return (table_id.endswith("fx")
+            or bool(entries) and all(e.start is None for e in entries))
+
+
+def chunks_for(da):
+    chunks = {}
+    for dim, size in da.sizes.items():
+        if dim == "time":
+            chunks[dim] = min(TIME_CHUNK, size)
+        elif dim in ("bnds", "nbnd", "d2", "vertices"):
+            chunks[dim] = size
+        else:
+            chunks[dim] = min(SPATIAL_TILE, size)
+    return chunks
+
+
+# ------------------------------------------------------------------
+# Convert
+# ------------------------------------------------------------------
+def convert(variable, table_id, member, experiment, data_dir=DATA_DIR,
+            store_dir=STORE_DIR):
+    entries = catalog.find(variable, table_id, member=member,
+                           experiment=experiment, data_dir=data_dir)
+    if not entries:
+        raise FileNotFoundError(
+            f"No {variable}_{table_id} files for {experiment} {member} "
+            f"in the catalog")
+    if time_invariant(table_id, entries):
+        raise ValueError(
+            f"{variable}_{table_id} has no time axis – there is nothing to "
+            f"concatenate; open the file directly (catalog.find)")
+
+    print(f"Converting {len(entries)} {variable} file(s) → Zarr...")
+    ds = xr.open_mfdataset(
+        catalog.paths(entries),
+        combine="nested",
+        concat_dim="time",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        parallel=True,
+    )
+    # Sort and de-duplicate once here so readers never have to
+    ds = ds.sortby("time")
+    ds = ds.isel(time=~ds.get_index("time").duplicated())
+
+    encoding = {}
+    for name, var in ds.variables.items():
+        var.encoding = {k: v for k, v in var.encoding.items()
+                        if k in KEEP_ENCODING}
+        if name in ds.data_vars and var.ndim:
+            encoding[name] = {**compression("blosc"),
+                              "chunks": tuple(chunks_for(var).values())}
+    ds = ds.chunk({dim: c for name in ds.data_vars
+                   for dim, c in chunks_for(ds[name]).items()})
+
+    ds.attrs["source_fingerprint"] = fingerprint(entries)
+    ds.attrs["source_files"] = json.dumps(
+        [Path(e.path).name for e in entries])
+
+    path = store_path(variable, table_id, member, experiment, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with stage("convert", variable=variable, files=len(entries)):
+        ds.to_zarr(path, mode="w", consolidated=True, encoding=encoding)
+    print(f"   Saved: {path}")
+    return path
+
+
+# ------------------------------------------------------------------
+# Open
+# ------------------------------------------------------------------
+def open_store(variable, table_id, member="r1i1p1f2", experiment="G6sulfur",
+               data_dir=DATA_DIR, store_dir=STORE_DIR, chunks=None):
+    """
+    Open the store for a variable, (re)building it if missing or stale.
+
+    `chunks` is passed to xr.open_zarr; None keeps the on-disk chunks.
+    """
+    if chunks is None:
+        chunks = {}
+    path = store_path(variable, table_id, member, experiment, store_dir)
+    with stage("open", variable=variable, member=member,
+               experiment=experiment) as record:
+        entries = catalog.find(variable, table_id, member=member,
+                               experiment=experiment, data_dir=data_dir)
+        with _convert_lock:
+            if path.exists():
+                ds = xr.open_zarr(path, consolidated=True, chunks=chunks)
+                if not entries or ds.attrs.get("source_fingerprint") == fingerprint(entries):
+                    return ds
+                ds.close()
+                print(f"{path.name} is stale – rebuilding")
+            record["rebuilt"] = True
+            convert(variable, table_id, member, experiment, data_dir, store_dir)
+            return xr.open_zarr(path, consolidated=True, chunks=chunks)
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variable")
+    parser.add_argument("--table", dest="table_id")
+    parser.add_argument("--member")
+    parser.add_argument("--experiment")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    for variable, table_id, member, experiment in catalog.datasets(args.data_dir):
+        wanted = (args.variable, args.table_id, args.member, args.experiment)
+        have = (variable, table_id, member, experiment)
+        if any(w is not None and w != h for w, h in zip(wanted, have)):
+            continue
+        if time_invariant(table_id):
+            print(f"Skipping {variable}_{table_id} (no time axis)")
+            continue
+        convert(variable, table_id, member, experiment, args.data_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())